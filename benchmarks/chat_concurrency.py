@@ -0,0 +1,95 @@
+"""
+Measures concurrent-chat throughput of one process for the sync and async LangGraph paths.
+
+Retrieval and Gemini are replaced with stand-ins (Gemini sleeps for --latency seconds), so the
+numbers isolate how many chats the workflow can keep in flight:
+  * sync:  run_graph_workflow on a thread pool capped like FastAPI's default (40 threads)
+  * async: arun_graph_workflow multiplexed on one event loop
+
+Usage: python -m benchmarks.chat_concurrency --concurrency 1 16 64 128 --requests 256 --latency 0.5
+"""
+import os
+import sys
+import time
+import json
+import shutil
+import asyncio
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# The Gemini client refuses to import without a key; it is never called here
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-placeholder")
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FASTAPI_THREADPOOL_SIZE = 40
+
+def _install_stand_ins(latency: float):
+    from graphs import langgraph_workflow
+
+    hits = [{"id": f"chunk_{i}", "document": f"Context chunk {i}", "metadata": {}, "distance": 0.5, "similarity": 0.75} for i in range(5)]
+
+    def fake_retrieve(query, collection_name, n_results=5):
+        return hits
+
+    def fake_generate(query, context, model_name="gemini-1.5-flash", chat_history=None):
+        time.sleep(latency)
+        return f"Answer to {query}"
+
+    async def fake_agenerate(query, context, model_name="gemini-1.5-flash", chat_history=None):
+        await asyncio.sleep(latency)
+        return f"Answer to {query}"
+
+    langgraph_workflow.query_vector_db_scored = fake_retrieve
+    langgraph_workflow.get_relevance_threshold = lambda collection_name: 0.2
+    langgraph_workflow.get_gemini_response = fake_generate
+    langgraph_workflow.aget_gemini_response = fake_agenerate
+
+def run_sync(concurrency: int, requests: int) -> float:
+    from graphs import langgraph_workflow
+
+    workers = min(concurrency, FASTAPI_THREADPOOL_SIZE)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda i: langgraph_workflow.run_graph_workflow(f"question {i}", "benchmark"), range(requests)))
+    return requests / (time.perf_counter() - started)
+
+async def run_async(concurrency: int, requests: int) -> float:
+    from graphs import langgraph_workflow
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            await langgraph_workflow.arun_graph_workflow(f"question {i}", "benchmark")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return requests / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64, 128])
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated Gemini latency in seconds")
+    args = parser.parse_args()
+
+    # Importing the workflow opens the vector store and state database in the working directory
+    workdir = tempfile.mkdtemp(prefix="aira-chat-")
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(workdir)
+    try:
+        _install_stand_ins(args.latency)
+        results = []
+        for concurrency in args.concurrency:
+            sync_rps = run_sync(concurrency, args.requests)
+            async_rps = asyncio.run(run_async(concurrency, args.requests))
+            results.append({"concurrency": concurrency, "sync_rps": round(sync_rps, 2), "async_rps": round(async_rps, 2)})
+            print(f"concurrency={concurrency:4d}  sync={sync_rps:8.2f} req/s  async={async_rps:8.2f} req/s")
+    finally:
+        os.chdir(REPO_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Synthetic corpora and local stand-ins for AIRA's external dependencies, shared by the benchmarks.
+
+Nothing here touches the network: arXiv papers are generated PDFs, GitHub repositories are local
+git repositories (cloned through the real `iter_repo_files`), and Gemini answers after a configurable
+sleep. Import this module before anything from the application so the Gemini client can load without a key.
+"""
+import os
+import time
+import random
+import asyncio
+import hashlib
+import subprocess
+
+# The Gemini client refuses to import without a key; it is never called when the stand-ins are installed
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-placeholder")
+
+_WORDS = (
+    "retrieval augmented generation embedding vector index query latency throughput chunk document "
+    "transformer attention layer gradient optimizer dataset benchmark evaluation recall precision "
+    "repository function class module parser tokenizer cache database session graph node pipeline "
+    "stream batch worker thread process memory storage network request response model inference"
+).split()
+
+_CODE_TEMPLATE = '''"""{doc}"""
+import os
+
+
+class {cls}:
+    """{doc}"""
+
+    def __init__(self, {arg}):
+        self.{arg} = {arg}
+
+    def {fn}(self, value):
+        # {doc}
+        total = 0
+        for item in range(value):
+            total += item * len(str(self.{arg}))
+        return total
+
+
+def {fn}_helper({arg}):
+    """{doc}"""
+    return {cls}({arg}).{fn}(10)
+'''
+
+def sentence(rng: random.Random, words: int = 12) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+def paragraph(rng: random.Random, sentences: int = 6) -> str:
+    return " ".join(sentence(rng) for _ in range(sentences))
+
+def text_documents(count: int, paragraphs: int = 4, seed: int = 0) -> list:
+    """Returns `count` synthetic prose documents as {"source", "content"} dicts (about 1 KB per paragraph)."""
+    rng = random.Random(seed)
+    return [
+        {"source": f"doc_{i}.txt", "content": "\n\n".join(paragraph(rng) for _ in range(paragraphs))}
+        for i in range(count)
+    ]
+
+def _identifier(rng: random.Random) -> str:
+    return "_".join(rng.sample(_WORDS, 2))
+
+def make_git_repo(path: str, files: int = 50, seed: int = 0) -> str:
+    """Creates a local git repository of synthetic Python modules and Markdown docs and returns its path."""
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(path, "src"), exist_ok=True)
+    os.makedirs(os.path.join(path, "docs"), exist_ok=True)
+    for i in range(files):
+        if i % 5 == 4:
+            body = "\n\n".join(f"## {sentence(rng, 4)}\n\n{paragraph(rng)}" for _ in range(4))
+            with open(os.path.join(path, "docs", f"guide_{i}.md"), "w", encoding="utf-8") as f:
+                f.write(f"# Guide {i}\n\n{body}\n")
+        else:
+            modules = [
+                _CODE_TEMPLATE.format(doc=sentence(rng), cls=f"Component{i}_{j}", fn=_identifier(rng), arg=rng.choice(_WORDS))
+                for j in range(3)
+            ]
+            with open(os.path.join(path, "src", f"module_{i}.py"), "w", encoding="utf-8") as f:
+                f.write("\n\n".join(modules))
+    git = ["git", "-C", path, "-c", "user.name=bench", "-c", "user.email=bench@example.com"]
+    subprocess.run(["git", "init", "-q", path], check=True)
+    subprocess.run(git + ["add", "-A"], check=True)
+    subprocess.run(git + ["commit", "-q", "-m", "Synthetic repository"], check=True)
+    return path
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def make_pdf(pages: list) -> bytes:
+    """Writes a minimal PDF with one page of Helvetica text per entry in `pages` (lines split on newlines)."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        lines = [_pdf_escape(line) for line in text.splitlines()]
+        stream = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return bytes(out)
+
+def pdf_pages(rng: random.Random, pages: int = 3, lines: int = 40) -> list:
+    return ["\n".join(sentence(rng, 10) for _ in range(lines)) for _ in range(pages)]
+
+def make_local_corpus(data_dir: str, text_files: int = 20, pdf_files: int = 5, seed: int = 0) -> str:
+    """Fills `data_dir` with synthetic .txt and .pdf files for the user_local_files source."""
+    rng = random.Random(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    for doc in text_documents(text_files, seed=seed):
+        with open(os.path.join(data_dir, doc["source"]), "w", encoding="utf-8") as f:
+            f.write(doc["content"])
+    for i in range(pdf_files):
+        with open(os.path.join(data_dir, f"paper_{i}.pdf"), "wb") as f:
+            f.write(make_pdf(pdf_pages(rng)))
+    return data_dir
+
+# --- Stand-ins ---
+
+class HashEmbeddings:
+    """
+    Deterministic bag-of-words embedder with the same interface and dimension as all-MiniLM-L6-v2.
+    Lets the benchmarks run without downloading the model; its cost is far below the real one.
+    """
+    dimension = 384
+
+    def _embed(self, text: str) -> list:
+        vector = [0.0] * self.dimension
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest()[:8], 16) % self.dimension] += 1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: list) -> list:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list:
+        return self._embed(text)
+
+class FakeGeminiModel:
+    """Stands in for genai.GenerativeModel; answers after `latency` seconds."""
+
+    class _Response:
+        def __init__(self, text):
+            self.text = text
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def generate_content(self, prompt, **kwargs):
+        time.sleep(self.latency)
+        return self._Response(self._answer(prompt))
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        await asyncio.sleep(self.latency)
+        if stream:
+            return self._stream(self._answer(prompt))
+        return self._Response(self._answer(prompt))
+
+    async def _stream(self, text: str):
+        for word in text.split(" "):
+            yield self._Response(word + " ")
+
+    @staticmethod
+    def _answer(prompt) -> str:
+        if "JSON object" in str(prompt):
+            return '{"title": "Benchmark session", "summary": "Synthetic summary."}'
+        return f"Synthetic answer based on {len(str(prompt))} prompt characters."
+
+def fake_arxiv_papers(query: str, max_results=5) -> list:
+    """Stand-in for arxiv_api.fetch_papers: generates PDFs, parses them with the same library and returns the same fields."""
+    import PyPDF2
+    from io import BytesIO
+    from modules.chunking import PAGE_SEPARATOR
+    rng = random.Random(query)
+    papers = []
+    for i in range(max_results):
+        reader = PyPDF2.PdfReader(BytesIO(make_pdf(pdf_pages(rng))))
+        text = PAGE_SEPARATOR.join(page.extract_text() or "" for page in reader.pages)
+        title = f"{sentence(rng, 6)[:-1]} ({query})"
+        papers.append({
+            "title": title,
+            "summary": sentence(rng, 30),
+            "content": text,
+            "pdf_url": f"https://arxiv.org/pdf/bench.{rng.randrange(10**5):05d}v{i + 1}",
+            "source": "arxiv",
+        })
+    return papers
+
+def fake_github_docs(query: str, max_repos=3) -> list:
+    """Stand-in for github_docs.fetch_docs: synthetic README documents."""
+    rng = random.Random(query)
+    return [
+        {"title": f"bench/{query.replace(' ', '-')}-{i}", "content": "\n\n".join(paragraph(rng) for _ in range(3)),
+         "metadata": {"source": f"https://example.com/bench/repo-{i}"}}
+        for i in range(max_repos)
+    ]
+
+def fake_search_github_repos(query: str) -> list:
+    return [{"name": f"repo-{i}", "full_name": f"bench/repo-{i}", "description": sentence(random.Random(i)),
+             "html_url": f"https://example.com/bench/repo-{i}", "stargazers_count": 0} for i in range(5)]
+
+def install_stand_ins(gemini_latency: float = 0.0, hash_embeddings: bool = False):
+    """
+    Replaces arXiv, GitHub and Gemini with the local stand-ins above (and, optionally, the embedding model
+    with HashEmbeddings) in every module that holds a reference to them.
+    """
+    import sys
+    import context_router
+    from context_sources import arxiv_api, github_docs
+    from modules import gemini_llm, rag_pipeline
+
+    arxiv_api.fetch_papers = fake_arxiv_papers
+    github_docs.fetch_docs = fake_github_docs
+    github_docs.search_github_repos = fake_search_github_repos
+    context_router.SOURCE_FETCHERS["arxiv_api"] = fake_arxiv_papers
+    context_router.SOURCE_FETCHERS["github_docs"] = fake_github_docs
+
+    # get_model is the only way the application reaches the Gemini client
+    model = FakeGeminiModel(gemini_latency)
+    gemini_llm.get_model = lambda model_name="gemini-1.5-flash": model
+    gemini_llm._models.clear()
+    if "mcp_server" in sys.modules:
+        sys.modules["mcp_server"].get_model = gemini_llm.get_model
+
+    if hash_embeddings:
+        rag_pipeline.embedding_function = HashEmbeddings()
+        rag_pipeline._probe_cache.clear()
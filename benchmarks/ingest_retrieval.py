@@ -0,0 +1,173 @@
+"""
+Offline benchmark of AIRA's ingest and retrieval paths.
+
+arXiv, GitHub and Gemini are replaced with the local stand-ins in benchmarks/fixtures.py, and everything
+runs in a scratch directory, so the numbers are reproducible and nothing outside it is touched.
+For each collection size it measures:
+  * ingest throughput (chunks/s) of process_and_store_documents on synthetic prose
+  * p50/p95/p99 latency of query_vector_db and run_graph_workflow (Gemini sleeps for --latency seconds)
+plus chunks/s for a synthetic code repository cloned through iter_repo_files, context fetch time over a
+local corpus with fixture PDFs (and an ingest of the fetched documents), and peak RSS. Results are written as JSON so runs can be compared.
+
+Usage: python -m benchmarks.ingest_retrieval --sizes 100 1000 5000 --queries 200 --output results.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+
+from benchmarks import fixtures
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None # Not available on Windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _percentiles(samples_ms: list) -> dict:
+    samples = sorted(samples_ms)
+    pick = lambda q: round(samples[min(len(samples) - 1, int(len(samples) * q))], 3)
+    return {"count": len(samples), "mean_ms": round(statistics.fmean(samples), 3),
+            "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+def _time_calls(fn, args_list: list) -> dict:
+    samples = []
+    for args in args_list:
+        started = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - started) * 1000)
+    return _percentiles(samples)
+
+def _queries(count: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    return [fixtures.sentence(rng, rng.randint(4, 10)) for _ in range(count)]
+
+def bench_collection(size: int, queries: int) -> dict:
+    from langchain_core.documents import Document
+    from modules.rag_pipeline import process_and_store_documents, query_vector_db
+    from graphs.langgraph_workflow import run_graph_workflow
+
+    collection_name = f"bench_prose_{size}"
+    docs = (
+        Document(page_content=d["content"], metadata={"source": d["source"]})
+        for d in fixtures.text_documents(size, seed=size)
+    )
+    started = time.perf_counter()
+    stats = process_and_store_documents(docs, collection_name=collection_name)
+    total = time.perf_counter() - started
+
+    questions = _queries(queries)
+    return {
+        "documents": stats["documents"],
+        "chunks": stats["chunks"],
+        "ingest_seconds": round(total, 3),
+        "pipeline_seconds": stats["elapsed"],
+        "chunks_per_second": round(stats["chunks"] / stats["elapsed"], 1) if stats["elapsed"] else None,
+        "query_vector_db": _time_calls(query_vector_db, [(q, collection_name) for q in questions]),
+        "run_graph_workflow": _time_calls(run_graph_workflow, [(q, collection_name) for q in questions]),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+def bench_repository(files: int) -> dict:
+    from langchain_core.documents import Document
+    from modules.rag_pipeline import process_and_store_documents
+    from context_sources.github_docs import iter_repo_files
+
+    origin = fixtures.make_git_repo(os.path.abspath(os.path.join("fixtures", "bench_repo")), files=files)
+    started = time.perf_counter()
+    docs = (
+        Document(page_content=d["content"], metadata={"source": d["source"], "repo_name": "bench_repo"})
+        for d in iter_repo_files(origin, os.path.join("data", "bench_repo"))
+    )
+    stats = process_and_store_documents(docs, collection_name="bench_repo")
+    total = time.perf_counter() - started
+    return {
+        "files": stats["documents"],
+        "chunks": stats["chunks"],
+        "seconds": round(total, 3),
+        "chunks_per_second": round(stats["chunks"] / total, 1) if total else None,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+def bench_sources(queries: int) -> dict:
+    from context_router import fetch_context
+    from modules.rag_pipeline import process_and_store_documents
+
+    fixtures.make_local_corpus("data", text_files=50, pdf_files=10)
+    questions = _queries(queries, seed=2)
+    sources = ["arxiv_api", "user_local_files", "github_docs"]
+    # The first call builds the local file index; it is reported separately
+    started = time.perf_counter()
+    first = fetch_context(questions[0], sources)
+    first_fetch = time.perf_counter() - started
+    # Ingest what the sources returned, as /start_chat would, so their document shapes are exercised too
+    stats = process_and_store_documents(first["documents"], collection_name="bench_sources")
+    return {
+        "first_fetch_seconds": round(first_fetch, 3),
+        "documents_per_fetch": len(first["documents"]),
+        "ingested_chunks": stats["chunks"],
+        "fetch_context": _time_calls(fetch_context, [(q, sources) for q in questions]),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000], help="Documents per collection (~4 KB each)")
+    parser.add_argument("--queries", type=int, default=200, help="Queries timed per collection")
+    parser.add_argument("--repo-files", type=int, default=200, help="Files in the synthetic repository")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated Gemini latency in seconds")
+    parser.add_argument("--hash-embeddings", action="store_true", help="Use a hash embedder instead of all-MiniLM-L6-v2")
+    parser.add_argument("--workdir", help="Scratch directory (default: a temporary directory, removed afterwards)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="aira-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    # The vector store, caches and clones all live under the working directory
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(workdir)
+    try:
+        fixtures.install_stand_ins(gemini_latency=args.latency, hash_embeddings=args.hash_embeddings)
+        results = {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "platform": {"python": platform.python_version(), "machine": platform.machine(), "system": platform.system(),
+                         "cpus": os.cpu_count()},
+            "settings": vars(args),
+            "collections": {},
+        }
+        for size in args.sizes:
+            print(f"--- Collection of {size} documents ---")
+            results["collections"][str(size)] = bench_collection(size, args.queries)
+        print("--- Synthetic repository ---")
+        results["repository"] = bench_repository(args.repo_files)
+        print("--- Context sources ---")
+        results["sources"] = bench_sources(min(args.queries, 50))
+        results["peak_rss_mb"] = _peak_rss_mb()
+    finally:
+        os.chdir(REPO_ROOT)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    for size, result in results["collections"].items():
+        print(f"size={size:>6}  chunks={result['chunks']:>7}  ingest={result['chunks_per_second']} chunks/s  "
+              f"query p50/p95/p99={result['query_vector_db']['p50_ms']}/{result['query_vector_db']['p95_ms']}/"
+              f"{result['query_vector_db']['p99_ms']} ms  graph p50={result['run_graph_workflow']['p50_ms']} ms")
+    print(f"repository: {results['repository']['chunks_per_second']} chunks/s   peak RSS: {results['peak_rss_mb']} MB")
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
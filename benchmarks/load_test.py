@@ -0,0 +1,206 @@
+"""
+Concurrent load test for the FastAPI server with realistic mixed traffic.
+
+Each virtual user runs one session: /fetch_sources, /start_chat with some of the fetched documents,
+a burst of /chat calls, and now and then a /process_github_repo ingest of a local synthetic repository.
+Concurrency is ramped through --levels; for every level the tool reports throughput, per-endpoint
+latency percentiles and error rates, and the saturation point is the first level where throughput stops
+growing (or /chat p95 degrades past --max-chat-p95) relative to the previous one.
+
+arXiv, GitHub and Gemini are the local stand-ins from benchmarks/fixtures.py (Gemini sleeps --latency seconds).
+
+Modes:
+  asgi  drive mcp_server.app in-process through httpx's ASGI transport (no sockets)
+        python -m benchmarks.load_test asgi --levels 1 4 16 64
+  serve start a server with the stand-ins installed, to be driven over HTTP
+        python -m benchmarks.load_test serve --port 5050
+  http  drive a running server over HTTP
+        python -m benchmarks.load_test http --url http://127.0.0.1:5050 --levels 1 4 16 64
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import shutil
+import argparse
+import tempfile
+import statistics
+from collections import defaultdict
+
+import httpx
+
+from benchmarks import fixtures
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REQUEST_TIMEOUT = 300
+# Throughput must grow by at least this factor per level, otherwise the previous level is the saturation point
+SATURATION_GAIN = 1.1
+
+def _enter_workdir(workdir: str):
+    # The vector store, caches and clones of the server under test live in the scratch directory
+    workdir = workdir or tempfile.mkdtemp(prefix="aira-load-")
+    os.makedirs(workdir, exist_ok=True)
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(workdir)
+    return workdir
+
+def _load_app(latency: float, hash_embeddings: bool):
+    import mcp_server
+    fixtures.install_stand_ins(gemini_latency=latency, hash_embeddings=hash_embeddings)
+    return mcp_server.app
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, client: httpx.AsyncClient, endpoint: str, payload: dict):
+        started = time.perf_counter()
+        try:
+            response = await client.post(endpoint, json=payload)
+            ok = response.status_code == 200
+        except httpx.HTTPError:
+            response, ok = None, False
+        self.latencies[endpoint].append((time.perf_counter() - started) * 1000)
+        if not ok:
+            self.errors[endpoint] += 1
+            return None
+        return response.json()
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for endpoint, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+            pick = lambda q: round(samples[min(len(samples) - 1, int(len(samples) * q))], 1)
+            endpoints[endpoint] = {
+                "requests": len(samples),
+                "error_rate": round(self.errors[endpoint] / len(samples), 4),
+                "mean_ms": round(statistics.fmean(samples), 1),
+                "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99),
+            }
+        total = sum(len(s) for s in self.latencies.values())
+        return {
+            "requests": total,
+            "errors": sum(self.errors.values()),
+            "elapsed": round(elapsed, 3),
+            "throughput_rps": round(total / elapsed, 2) if elapsed else None,
+            "endpoints": endpoints,
+        }
+
+async def virtual_user(client: httpx.AsyncClient, recorder: Recorder, user: int, args, repo_url: str):
+    rng = random.Random(user)
+    topic = fixtures.sentence(rng, 3)[:-1]
+    fetched = await recorder.call(client, "/fetch_sources", {"query": topic, "context_sources": args.sources})
+    if not fetched or not fetched["documents"]:
+        return
+    session_id = f"load-{uuid.uuid4().hex[:12]}"
+    doc_ids = [doc["id"] for doc in rng.sample(fetched["documents"], min(args.docs_per_session, len(fetched["documents"])))]
+    if not await recorder.call(client, "/start_chat", {"session_id": session_id, "document_ids": doc_ids}):
+        return
+    for _ in range(args.chats_per_session):
+        await recorder.call(client, "/chat", {"session_id": session_id, "query": fixtures.sentence(rng, 8)})
+    if rng.random() < args.ingest_ratio:
+        repo_name = f"load-repo-{uuid.uuid4().hex[:8]}"
+        await recorder.call(client, "/process_github_repo", {"repo_url": repo_url, "repo_name": repo_name})
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, args, repo_url: str) -> dict:
+    recorder = Recorder()
+    users = iter(range(concurrency * args.sessions_per_user))
+
+    async def worker():
+        for user in users:
+            await virtual_user(client, recorder, user, args, repo_url)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"concurrency": concurrency, **recorder.report(time.perf_counter() - started)}
+
+def find_saturation(levels: list, max_chat_p95: float) -> dict:
+    """The last level before throughput stops growing or /chat p95 exceeds the limit."""
+    for previous, current in zip(levels, levels[1:]):
+        chat_p95 = current["endpoints"].get("/chat", {}).get("p95_ms", 0)
+        if current["throughput_rps"] < previous["throughput_rps"] * SATURATION_GAIN or chat_p95 > max_chat_p95:
+            return {"concurrency": previous["concurrency"], "throughput_rps": previous["throughput_rps"]}
+    return {"concurrency": None, "note": "Not saturated at the highest level tested"}
+
+async def drive(client: httpx.AsyncClient, args) -> dict:
+    repo_url = fixtures.make_git_repo(os.path.abspath(os.path.join("fixtures", "load_repo")), files=args.repo_files)
+    levels = []
+    for concurrency in args.levels:
+        result = await run_level(client, concurrency, args, repo_url)
+        levels.append(result)
+        chat = result["endpoints"].get("/chat", {})
+        print(f"concurrency={concurrency:4d}  {result['throughput_rps']:8.2f} req/s  errors={result['errors']}  "
+              f"chat p50/p95={chat.get('p50_ms')}/{chat.get('p95_ms')} ms")
+    return {"mode": args.mode, "settings": {k: v for k, v in vars(args).items() if k != "func"}, "levels": levels,
+            "saturation": find_saturation(levels, args.max_chat_p95)}
+
+async def run_asgi(args) -> dict:
+    app = _load_app(args.latency, args.hash_embeddings)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://aira", timeout=REQUEST_TIMEOUT) as client:
+        return await drive(client, args)
+
+async def run_http(args) -> dict:
+    # The synthetic repository is cloned by the server, so both must share a filesystem
+    limits = httpx.Limits(max_connections=max(args.levels), max_keepalive_connections=max(args.levels))
+    async with httpx.AsyncClient(base_url=args.url, timeout=REQUEST_TIMEOUT, limits=limits) as client:
+        return await drive(client, args)
+
+def serve(args):
+    import uvicorn
+    app = _load_app(args.latency, args.hash_embeddings)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="mode", required=True)
+
+    server = argparse.ArgumentParser(add_help=False)
+    server.add_argument("--latency", type=float, default=0.5, help="Simulated Gemini latency in seconds")
+    server.add_argument("--hash-embeddings", action="store_true", help="Use a hash embedder instead of all-MiniLM-L6-v2")
+    server.add_argument("--workdir", help="Scratch directory for the server's vector store and caches")
+
+    load = argparse.ArgumentParser(add_help=False)
+    load.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 64], help="Concurrent users per step")
+    load.add_argument("--sessions-per-user", type=int, default=2)
+    load.add_argument("--chats-per-session", type=int, default=5)
+    load.add_argument("--docs-per-session", type=int, default=3)
+    load.add_argument("--ingest-ratio", type=float, default=0.1, help="Fraction of sessions that also ingest a repository")
+    load.add_argument("--repo-files", type=int, default=20)
+    load.add_argument("--sources", nargs="+", default=["arxiv_api", "github_docs"])
+    load.add_argument("--max-chat-p95", type=float, default=5000, help="/chat p95 (ms) above which a level counts as saturated")
+    load.add_argument("--output", default="load_test_results.json")
+
+    subparsers.add_parser("asgi", parents=[server, load], help="Drive the app in-process")
+    http = subparsers.add_parser("http", parents=[load], help="Drive a running server over HTTP")
+    http.add_argument("--url", default="http://127.0.0.1:5050")
+    http.add_argument("--workdir", help="Scratch directory for the synthetic repository")
+    serve_parser = subparsers.add_parser("serve", parents=[server], help="Run a server with the stand-ins installed")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=5050)
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        _enter_workdir(args.workdir)
+        serve(args)
+        return
+
+    output = os.path.abspath(args.output)
+    workdir = _enter_workdir(args.workdir)
+    try:
+        results = asyncio.run(run_asgi(args) if args.mode == "asgi" else run_http(args))
+    finally:
+        os.chdir(REPO_ROOT)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saturation point: {results['saturation']}")
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
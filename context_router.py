@@ -1,5 +1,9 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from langchain_core.documents import Document
 from context_sources import arxiv_api, user_local_files, github_docs
+from utils import tracing
 
 SOURCE_FETCHERS = {
     "arxiv_api": arxiv_api.fetch_papers,
@@ -7,36 +11,137 @@ SOURCE_FETCHERS = {
     "github_docs": github_docs.fetch_docs, # Re-added for general context fetching
 }
 
+# Seconds each source may take before its results are abandoned
+SOURCE_TIMEOUTS = {
+    "arxiv_api": 45,
+    "user_local_files": 30,
+    "github_docs": 20,
+}
+DEFAULT_SOURCE_TIMEOUT = 30
+# Overall deadline for a fan-out; whatever finished in time is returned
+FETCH_DEADLINE = 60
+
+# Shared pool for source fetches. Timed-out fetches keep running here in the background,
+# so a module-level pool is used instead of one that would block on shutdown.
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="context-source")
+
+def _to_documents(source_name: str, docs_data: list) -> list:
+    """Normalizes a source's output into Document objects tagged with the source type."""
+    # This block handles sources that return Document objects directly (e.g., user_local_files)
+    if all(isinstance(d, Document) for d in docs_data):
+        for doc in docs_data:
+            doc.metadata['source_type'] = source_name
+        return list(docs_data)
+
+    # This block handles sources that return dictionaries (e.g., arxiv, github_docs)
+    docs = []
+    for doc_data in docs_data:
+        content = doc_data.get("content", "")
+        metadata = doc_data.get("metadata", {})
+
+        # Add or update metadata fields
+        metadata['source_type'] = source_name
+        if 'title' in doc_data and 'title' not in metadata:
+            metadata['title'] = doc_data['title']
+        # arXiv papers carry their location at the top level; it identifies the document's chunks
+        if 'source' not in metadata and doc_data.get('pdf_url'):
+            metadata['source'] = doc_data['pdf_url']
+
+        docs.append(Document(page_content=content, metadata=metadata))
+    return docs
+
+def _fetch_source(source_name: str, query: str) -> tuple:
+    """Runs one source fetcher, returning (documents, finished_at, error) so timing survives failures."""
+    with tracing.span("context.fetch_source", source=source_name) as s:
+        try:
+            docs = _to_documents(source_name, SOURCE_FETCHERS[source_name](query))
+            s.set(documents=len(docs))
+            return docs, time.monotonic(), None
+        except Exception as e:
+            s.set(error=str(e))
+            return [], time.monotonic(), e
+
+def _source_timeout(source_name: str, deadline: float) -> float:
+    return min(SOURCE_TIMEOUTS.get(source_name, DEFAULT_SOURCE_TIMEOUT), deadline)
+
+def _source_report(status: str, started: float, count: int = 0, error: str = None, finished: float = None) -> dict:
+    elapsed = (finished or time.monotonic()) - started
+    return {"status": status, "elapsed": round(elapsed, 3), "count": count, "error": error}
+
+def _completed_report(source_name: str, started: float, result: tuple) -> dict:
+    docs, finished, error = result
+    if error is not None:
+        print(f"Error fetching from {source_name}: {error}")
+        return _source_report("error", started, error=str(error), finished=finished)
+    return _source_report("ok", started, count=len(docs), finished=finished)
+
+@tracing.traced("context.fetch")
+def fetch_context(query: str, sources: list, deadline: float = FETCH_DEADLINE) -> dict:
+    """
+    Fetches context from all specified sources concurrently.
+    Each source gets its own timeout, capped by the overall deadline; sources that miss it are
+    reported as timed out and the documents from the others are returned as partial results.
+    Returns {"documents": [...], "sources": {source_name: {"status", "elapsed", "count", "error"}}}.
+    """
+    started = time.monotonic()
+    futures = {}
+    report = {}
+    for source_name in sources:
+        if source_name in SOURCE_FETCHERS:
+            futures[source_name] = _executor.submit(tracing.propagate(_fetch_source), source_name, query)
+        else:
+            report[source_name] = _source_report("unknown_source", started, error=f"Unknown source '{source_name}'")
+
+    all_docs = []
+    # Sources run concurrently, so waiting on each against an absolute deadline costs max(latency), not the sum
+    for source_name, future in futures.items():
+        remaining = started + _source_timeout(source_name, deadline) - time.monotonic()
+        try:
+            result = future.result(timeout=max(0, remaining))
+        except FutureTimeoutError:
+            print(f"Timed out fetching from {source_name}")
+            report[source_name] = _source_report("timeout", started, error="Timed out")
+            continue
+        all_docs.extend(result[0])
+        report[source_name] = _completed_report(source_name, started, result)
+    return {"documents": all_docs, "sources": report}
+
 def fetch_all_context(query: str, sources: list) -> list:
     """
     Fetches context from all specified sources, adds a source type to the metadata,
     and returns them as Document objects.
     """
-    all_docs = []
+    return fetch_context(query, sources)["documents"]
+
+async def stream_context(query: str, sources: list, deadline: float = FETCH_DEADLINE):
+    """
+    Async generator variant of fetch_context.
+    Yields (source_name, documents, source_report) as each source completes, in completion order.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+    tasks = {}
     for source_name in sources:
-        if source_name in SOURCE_FETCHERS:
-            try:
-                docs_data = SOURCE_FETCHERS[source_name](query)
-                
-                # This block handles sources that return Document objects directly (e.g., user_local_files)
-                if all(isinstance(d, Document) for d in docs_data):
-                    for doc in docs_data:
-                        doc.metadata['source_type'] = source_name
-                    all_docs.extend(docs_data)
-                    continue
+        if source_name not in SOURCE_FETCHERS:
+            yield source_name, [], _source_report("unknown_source", started, error=f"Unknown source '{source_name}'")
+            continue
+        future = loop.run_in_executor(_executor, tracing.propagate(_fetch_source), source_name, query)
+        task = asyncio.ensure_future(asyncio.wait_for(future, timeout=_source_timeout(source_name, deadline)))
+        tasks[task] = source_name
 
-                # This block handles sources that return dictionaries (e.g., arxiv, github_docs)
-                for doc_data in docs_data:
-                    content = doc_data.get("content", "")
-                    metadata = doc_data.get("metadata", {})
-                    
-                    # Add or update metadata fields
-                    metadata['source_type'] = source_name
-                    if 'title' in doc_data and 'title' not in metadata:
-                        metadata['title'] = doc_data['title']
-                    
-                    all_docs.append(Document(page_content=content, metadata=metadata))
-
-            except Exception as e:
-                print(f"Error fetching from {source_name}: {e}")
-    return all_docs
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                source_name = tasks[task]
+                try:
+                    result = task.result()
+                except asyncio.TimeoutError:
+                    print(f"Timed out fetching from {source_name}")
+                    yield source_name, [], _source_report("timeout", started, error="Timed out")
+                    continue
+                yield source_name, result[0], _completed_report(source_name, started, result)
+    finally:
+        for task in pending:
+            task.cancel()
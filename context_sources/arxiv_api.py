@@ -2,6 +2,8 @@ import arxiv
 import requests
 import PyPDF2
 from io import BytesIO
+from modules.chunking import PAGE_SEPARATOR
+from utils import tracing
 
 def fetch_papers(query: str, max_results=5) -> list:
     """
@@ -23,17 +25,19 @@ def fetch_papers(query: str, max_results=5) -> list:
         for result in results:
             try:
                 # Download the PDF content
-                response = requests.get(result.pdf_url)
-                response.raise_for_status()
+                with tracing.span("arxiv.download", url=result.pdf_url) as s:
+                    response = requests.get(result.pdf_url)
+                    response.raise_for_status()
+                    s.set(bytes=len(response.content))
                 
-                # Read the PDF from the downloaded content
-                pdf_file = BytesIO(response.content)
-                reader = PyPDF2.PdfReader(pdf_file)
-                
-                # Extract text from all pages
-                pdf_text = ""
-                for page in reader.pages:
-                    pdf_text += page.extract_text() or ""
+                with tracing.span("pdf.parse", source=result.pdf_url) as s:
+                    # Read the PDF from the downloaded content
+                    pdf_file = BytesIO(response.content)
+                    reader = PyPDF2.PdfReader(pdf_file)
+                    
+                    # Extract text from all pages, separated by form feeds so chunking can follow them
+                    pdf_text = PAGE_SEPARATOR.join(page.extract_text() or "" for page in reader.pages)
+                    s.set(pages=len(reader.pages), characters=len(pdf_text))
 
                 papers.append({
                     "title": result.title,
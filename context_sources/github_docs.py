@@ -1,60 +1,231 @@
 import os
+import pathlib
+import fnmatch
+import time
+import itertools
+import threading
 import git
 import requests
-from typing import List, Dict, Any
+from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Iterator
+from urllib.parse import quote_plus
+from utils import http_cache
 
-# Renamed the original fetch_docs to clone_and_read_repo_files
-def clone_and_read_repo_files(repo_url: str, clone_dir: str) -> List[Dict[str, str]]:
+# Load environment variables from .env file
+load_dotenv()
+
+# Define file extensions to parse as plain text
+# This list can be expanded to include other code files
+REPO_FILE_EXTENSIONS = (
+    ".md", ".py", ".js", ".ts", ".html", ".css", ".json", ".yaml", ".yml",
+    ".java", ".c", ".cpp", ".h", ".hpp", ".cs", ".go", ".php", ".rb", ".swift",
+    ".kt", ".kts", ".scala", ".rs", ".sh", ".ps1", ".bat"
+)
+
+# Paths that are never worth indexing, even when they are committed
+REPO_DENY_DIRS = {
+    ".git", "node_modules", "vendor", "third_party", "dist", "build",
+    "target", "bower_components", "__pycache__", ".venv", "venv", "site-packages",
+}
+REPO_DENY_PATTERNS = (
+    "*.min.js", "*.min.css", "*.map", "*.bundle.js", "*.lock",
+    "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "*.pb.go", "*_pb2.py",
+)
+GENERATED_MARKERS = ("@generated", "do not edit", "auto-generated", "autogenerated", "code generated")
+
+MAX_FILE_BYTES = 1 * 1024 * 1024
+MAX_REPO_BYTES = 50 * 1024 * 1024
+# Minified files tend to have very long lines
+MAX_AVG_LINE_LENGTH = 300
+REPO_READ_WORKERS = 8
+
+def _clone_url(repo_url: str) -> str:
+    """Git ignores --depth for plain local paths, so local repositories are cloned through a file:// URL."""
+    if os.path.isdir(repo_url):
+        return pathlib.Path(repo_url).resolve().as_uri()
+    return repo_url
+
+def _clone_or_update(repo_url: str, clone_dir: str):
+    """Shallow, single-branch clone, or a shallow fetch + reset if the clone already exists."""
+    if not os.path.exists(clone_dir):
+        print(f"Cloning repository: {repo_url}")
+        return git.Repo.clone_from(_clone_url(repo_url), clone_dir, depth=1, single_branch=True, no_tags=True)
+
+    print(f"Repository already cloned at {clone_dir}. Fetching latest changes...")
+    repo = git.Repo(clone_dir)
+    repo.remotes.origin.fetch(depth=1)
+    repo.git.reset("--hard", "FETCH_HEAD")
+    return repo
+
+def _list_candidate_files(repo, clone_dir: str) -> List[str]:
     """
-    Clones a GitHub repository and reads specified file types.
-    This function is intended for the /process_github_repo endpoint.
+    Lists the files worth reading. Only tracked files are considered, which respects `.gitignore`,
+    then the default deny-list, extension filter and per-file size cap are applied.
+    """
+    try:
+        tracked = repo.git.ls_files("-z").split("\0")
+    except Exception as e:
+        print(f"Could not list tracked files in {clone_dir}, falling back to a directory walk: {e}")
+        tracked = []
+        for root, dirnames, files in os.walk(clone_dir):
+            dirnames[:] = [d for d in dirnames if d not in REPO_DENY_DIRS]
+            tracked.extend(os.path.relpath(os.path.join(root, f), clone_dir) for f in files)
+
+    candidates = []
+    for rel_path in tracked:
+        if not rel_path or not rel_path.endswith(REPO_FILE_EXTENSIONS):
+            continue
+        parts = rel_path.replace("\\", "/").split("/")
+        if any(part in REPO_DENY_DIRS for part in parts[:-1]):
+            continue
+        if any(fnmatch.fnmatch(parts[-1], pattern) for pattern in REPO_DENY_PATTERNS):
+            continue
+        filepath = os.path.join(clone_dir, rel_path)
+        try:
+            if os.path.getsize(filepath) > MAX_FILE_BYTES:
+                continue
+        except OSError:
+            continue
+        candidates.append(filepath)
+    return candidates
+
+def _read_text_file(filepath: str):
+    """
+    Reads a file as text, returning (content, size in bytes), or None for binary or generated/minified content.
+    """
+    with open(filepath, "rb") as f:
+        raw = f.read(MAX_FILE_BYTES + 1)
+    head = raw[:8192]
+    if b"\0" in head:
+        return None
+    content = raw.decode("utf-8", errors="ignore")
+    lowered_head = content[:1024].lower()
+    if any(marker in lowered_head for marker in GENERATED_MARKERS):
+        return None
+    lines = content.count("\n") + 1
+    if len(content) / lines > MAX_AVG_LINE_LENGTH:
+        return None
+    return content, len(raw)
+
+def iter_repo_files(repo_url: str, clone_dir: str, max_workers: int = REPO_READ_WORKERS) -> Iterator[Dict[str, str]]:
+    """
+    Clones (or updates) a GitHub repository and yields {"source", "content"} dicts as files are read.
+    Files are read on a thread pool; binary, generated and oversized files are skipped,
+    and reading stops once MAX_REPO_BYTES of content has been yielded.
     """
-    docs = []
     try:
-        if not os.path.exists(clone_dir):
-            print(f"Cloning repository: {repo_url}")
-            git.Repo.clone_from(repo_url, clone_dir)
-        else:
-            print(f"Repository already cloned at {clone_dir}. Pulling latest changes...")
-            repo = git.Repo(clone_dir)
-            origin = repo.remotes.origin
-            origin.pull()
-
-        # Define file extensions to parse as plain text
-        # This list can be expanded to include other code files
-        file_extensions = (
-            ".md", ".py", ".js", ".ts", ".html", ".css", ".json", ".yaml", ".yml", 
-            ".java", ".c", ".cpp", ".h", ".hpp", ".cs", ".go", ".php", ".rb", ".swift",
-            ".kt", ".kts", ".scala", ".rs", ".sh", ".ps1", ".bat"
-        )
-
-        for root, _, files in os.walk(clone_dir):
-            for file in files:
-                if file.endswith(file_extensions):
-                    filepath = os.path.join(root, file)
+        repo = _clone_or_update(repo_url, clone_dir)
+        candidates = _list_candidate_files(repo, clone_dir)
+    except Exception as e:
+        print(f"An error occurred while cloning/fetching from GitHub: {e}")
+        return
+
+    total_bytes = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Keep a bounded number of reads in flight so a huge repo is never held in memory at once
+        paths = iter(candidates)
+        pending = {executor.submit(_read_text_file, p): p for p in itertools.islice(paths, max_workers * 2)}
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    filepath = pending.pop(future)
+                    next_path = next(paths, None)
+                    if next_path is not None:
+                        pending[executor.submit(_read_text_file, next_path)] = next_path
                     try:
-                        # Read the file and treat its content as plain text
-                        with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
-                            content = f.read()
-                            docs.append({"source": filepath, "content": content})
+                        result = future.result()
                     except Exception as e:
                         print(f"Could not read file {filepath}: {e}")
-    except Exception as e:
-        print(f"An error occurred while cloning/fetching from GitHub: {e}")
-    
-    return docs
+                        continue
+                    if result is None:
+                        continue
+                    # Counted in bytes on disk, not decoded characters, so non-ASCII repos respect the cap
+                    content, size = result
+                    total_bytes += size
+                    if total_bytes > MAX_REPO_BYTES:
+                        print(f"Reached the {MAX_REPO_BYTES} byte cap for {repo_url}; skipping remaining files.")
+                        return
+                    yield {"source": filepath, "content": content}
+        finally:
+            for future in pending:
+                future.cancel()
+
+def clone_and_read_repo_files(repo_url: str, clone_dir: str) -> List[Dict[str, str]]:
+    """
+    Clones a GitHub repository and reads specified file types.
+    This function is intended for the /process_github_repo endpoint.
+    """
+    return list(iter_repo_files(repo_url, clone_dir))
+
+# Optional token auth raises the API rate limit (60 -> 5000 requests/hour)
+GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+SEARCH_CACHE_TTL = 600
+README_CACHE_TTL = 3600
+# Stop spending requests once this few remain in the current rate-limit window
+RATE_LIMIT_RESERVE = 2
+# Longest we are willing to wait for a rate-limit window to reset
+MAX_RATE_LIMIT_WAIT = 10
+
+# Latest X-RateLimit-* values per API resource ("core", "search", ...)
+_rate_limits = {}
+_rate_limit_lock = threading.Lock()
+
+def _github_headers(accept: str) -> Dict[str, str]:
+    headers = {"Accept": accept}
+    if GITHUB_TOKEN:
+        headers["Authorization"] = f"Bearer {GITHUB_TOKEN}"
+    return headers
+
+def _record_rate_limit(resource: str, headers: Dict[str, str]):
+    remaining = headers.get("X-RateLimit-Remaining") or headers.get("x-ratelimit-remaining")
+    reset = headers.get("X-RateLimit-Reset") or headers.get("x-ratelimit-reset")
+    if remaining is None or reset is None:
+        return
+    with _rate_limit_lock:
+        _rate_limits[resource] = (int(remaining), float(reset))
+
+def get_rate_limit_status() -> Dict[str, Dict[str, float]]:
+    """Returns the last seen rate-limit window for each GitHub API resource."""
+    with _rate_limit_lock:
+        return {resource: {"remaining": remaining, "reset": reset} for resource, (remaining, reset) in _rate_limits.items()}
+
+def _github_get(url: str, accept: str, resource: str, ttl: float) -> http_cache.CachedResponse:
+    """
+    GETs a GitHub API URL through the persistent HTTP cache, backing off before the rate limit is hit.
+    When the window is exhausted, a stale cached copy is served if there is one.
+    """
+    headers = _github_headers(accept)
+    with _rate_limit_lock:
+        remaining, reset = _rate_limits.get(resource, (None, 0))
+    wait_seconds = reset - time.time()
+    if remaining is not None and remaining <= RATE_LIMIT_RESERVE and wait_seconds > 0:
+        stale = http_cache.get_cached(url, headers)
+        if stale is not None:
+            print(f"GitHub {resource} rate limit nearly exhausted; serving cached response for {url}")
+            return stale
+        if wait_seconds > MAX_RATE_LIMIT_WAIT:
+            raise requests.exceptions.RequestException(
+                f"GitHub {resource} rate limit nearly exhausted; resets in {int(wait_seconds)}s"
+            )
+        time.sleep(wait_seconds)
+
+    response = http_cache.cached_get(url, headers=headers, ttl=ttl)
+    if not response.from_cache or response.revalidated:
+        _record_rate_limit(resource, response.headers)
+    response.raise_for_status()
+    return response
 
 def search_github_repos(query: str) -> List[Dict[str, Any]]:
     """
     Searches GitHub repositories based on a user's query using the GitHub REST API.
     Extracts full_name, description, html_url, default_branch, owner.login, and stargazers_count.
     """
-    search_url = f"https://api.github.com/search/repositories?q={query}"
-    headers = {"Accept": "application/vnd.github.v3+json"} # Recommended by GitHub API docs
+    search_url = f"https://api.github.com/search/repositories?q={quote_plus(query)}"
 
     try:
-        response = requests.get(search_url, headers=headers)
-        response.raise_for_status() # Raise an exception for HTTP errors
+        response = _github_get(search_url, "application/vnd.github.v3+json", "search", SEARCH_CACHE_TTL)
         data = response.json()
         
         repos = []
@@ -77,42 +248,45 @@ def fetch_readme_content(owner: str, repo: str) -> str:
     Fetches the README.md content for a given GitHub repository.
     """
     readme_url = f"https://api.github.com/repos/{owner}/{repo}/readme"
-    headers = {"Accept": "application/vnd.github.v3.raw"} # To get raw content
 
     try:
-        response = requests.get(readme_url, headers=headers)
-        response.raise_for_status() # Raise an exception for HTTP errors
+        # Request the raw content
+        response = _github_get(readme_url, "application/vnd.github.v3.raw", "core", README_CACHE_TTL)
         return response.text
     except requests.exceptions.RequestException as e:
         print(f"Error fetching README for {owner}/{repo}: {e}")
         return f"Could not fetch README: {e}"
 
+def _readme_doc(repo: Dict[str, Any]):
+    owner = repo.get("owner_login")
+    repo_name = (repo.get("full_name") or "").split('/')[-1] # Extract repo name from full_name
+    if not owner or not repo_name:
+        return None
+
+    readme_content = fetch_readme_content(owner, repo_name)
+    if not readme_content or "Could not fetch README" in readme_content:
+        return None
+    # Create a preview of the README content
+    readme_preview = readme_content[:300] + "..." if len(readme_content) > 300 else readme_content
+    return {
+        "title": f"{repo.get('full_name')} by {repo.get('owner_login')} (README Preview)",
+        "content": f"Description: {repo.get('description', 'No description')}\n\nREADME Preview:\n{readme_preview}",
+        "metadata": {
+            "source": repo.get("html_url"),
+            "is_full_repo": False
+        }
+    }
+
 def fetch_docs(query: str, max_repos=3) -> List[Dict[str, str]]:
     """
     Searches GitHub repositories and fetches README content from top results.
-    This function is intended for the general context fetching (e.g., by context_router).
+    READMEs are fetched concurrently. This function is intended for the general context fetching (e.g., by context_router).
     """
     print(f"Searching GitHub for repos with query: '{query}'")
-    repos = search_github_repos(query)
-    
-    docs = []
-    for i, repo in enumerate(repos):
-        if i >= max_repos: # Limit the number of READMEs fetched
-            break
-        owner = repo.get("owner_login")
-        repo_name = repo.get("full_name").split('/')[1] # Extract repo name from full_name
-        
-        if owner and repo_name:
-            readme_content = fetch_readme_content(owner, repo_name)
-            if readme_content and "Could not fetch README" not in readme_content:
-                # Create a preview of the README content
-                readme_preview = readme_content[:300] + "..." if len(readme_content) > 300 else readme_content
-                docs.append({
-                    "title": f"{repo.get('full_name')} by {repo.get('owner_login')} (README Preview)",
-                    "content": f"Description: {repo.get('description', 'No description')}\n\nREADME Preview:\n{readme_preview}",
-                    "metadata": {
-                        "source": repo.get("html_url"),
-                        "is_full_repo": False
-                    }
-                })
-    return docs
+    repos = search_github_repos(query)[:max_repos] # Limit the number of READMEs fetched
+    if not repos:
+        return []
+
+    with ThreadPoolExecutor(max_workers=len(repos)) as executor:
+        # map preserves the search ranking
+        return [doc for doc in executor.map(_readme_doc, repos) if doc]
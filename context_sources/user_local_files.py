@@ -1,32 +1,221 @@
 import os
+import re
+import math
+import fnmatch
+import sqlite3
+import threading
+from collections import Counter
 import PyPDF2
 from langchain.docstore.document import Document
+from modules.chunking import PAGE_SEPARATOR
+from utils import tracing
 
-def read_files(query: str, data_dir="data/") -> list:
+# Persistent index of the local corpus, so unchanged files are never re-parsed
+INDEX_PATH = "cache/local_corpus.sqlite"
+
+# Files under the data directory that are part of the local corpus
+INCLUDE_PATTERNS = ["*.txt", "*.pdf"]
+# Directories (relative to the data directory) that hold AIRA's own state.
+# Any directory containing a `.git` entry (e.g. repos cloned by /process_github_repo) is skipped as well.
+EXCLUDE_PATTERNS = ["chat_sessions", ".*"]
+
+MAX_RESULTS = 50
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_index_lock = threading.Lock()
+
+def _tokenize(text: str) -> list:
+    return _TOKEN_RE.findall(text.lower())
+
+def _connect(index_path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(index_path, timeout=30)
+    # WAL lets searches in other workers read while one worker syncs; NORMAL keeps per-file commits cheap
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            relpath TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            content TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS postings (
+            term TEXT NOT NULL,
+            path TEXT NOT NULL,
+            tf INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_postings_term ON postings(term);
+        CREATE INDEX IF NOT EXISTS idx_postings_path ON postings(path);
+    """)
+    return conn
+
+def _is_excluded(rel_dir: str, name: str, exclude_patterns: list) -> bool:
+    rel_path = os.path.join(rel_dir, name) if rel_dir else name
+    rel_path = rel_path.replace(os.sep, "/")
+    return any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(rel_path, p) for p in exclude_patterns)
+
+def _walk_corpus(data_dir: str, include_patterns: list, exclude_patterns: list):
+    """Yields (abs_path, rel_path, stat) for every corpus file under data_dir."""
+    for root, dirnames, filenames in os.walk(data_dir):
+        rel_dir = os.path.relpath(root, data_dir)
+        rel_dir = "" if rel_dir == "." else rel_dir
+        # Prune excluded directories and cloned repositories in place
+        dirnames[:] = [
+            d for d in dirnames
+            if not _is_excluded(rel_dir, d, exclude_patterns)
+            and not os.path.exists(os.path.join(root, d, ".git"))
+        ]
+        for filename in filenames:
+            if not any(fnmatch.fnmatch(filename, p) for p in include_patterns):
+                continue
+            if _is_excluded(rel_dir, filename, exclude_patterns):
+                continue
+            filepath = os.path.join(root, filename)
+            try:
+                stat = os.stat(filepath)
+            except OSError:
+                continue
+            rel_path = os.path.join(rel_dir, filename).replace(os.sep, "/")
+            yield os.path.abspath(filepath), rel_path, stat
+
+def _extract_text(filepath: str) -> str:
+    content = ""
+    if filepath.endswith(".pdf"):
+        with tracing.span("pdf.parse", source=filepath) as s, open(filepath, "rb") as f:
+            reader = PyPDF2.PdfReader(f)
+            # Pages are kept apart with form feeds so chunking can follow them
+            content = PAGE_SEPARATOR.join(page.extract_text() or "" for page in reader.pages)
+            s.set(pages=len(reader.pages), characters=len(content))
+    else:
+        with open(filepath, "r", encoding="utf-8", errors="ignore") as f:
+            content = f.read()
+    return content
+
+def sync_index(data_dir="data/", index_path=INDEX_PATH, include_patterns=None, exclude_patterns=None) -> dict:
     """
-    Reads .pdf and .txt files in the data directory and returns them as LangChain Document objects.
+    Brings the local corpus index up to date with the data directory.
+    Files are tracked by (path, size, mtime) and only new or changed files are re-extracted.
+    Each file is committed on its own, so server workers syncing or searching the same index
+    only ever wait for one file's write.
+    """
+    include_patterns = include_patterns or INCLUDE_PATTERNS
+    exclude_patterns = EXCLUDE_PATTERNS if exclude_patterns is None else exclude_patterns
+    stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+    if not os.path.exists(data_dir):
+        return stats
+
+    root_prefix = os.path.join(os.path.abspath(data_dir), "")
+    with _index_lock:
+        conn = _connect(index_path)
+        try:
+            known = {
+                path: (size, mtime_ns)
+                for path, size, mtime_ns in conn.execute(
+                    "SELECT path, size, mtime_ns FROM files WHERE substr(path, 1, ?) = ?",
+                    (len(root_prefix), root_prefix),
+                )
+            }
+            seen = set()
+            for path, rel_path, stat in _walk_corpus(data_dir, include_patterns, exclude_patterns):
+                seen.add(path)
+                if known.get(path) == (stat.st_size, stat.st_mtime_ns):
+                    stats["unchanged"] += 1
+                    continue
+                try:
+                    content = _extract_text(path)
+                except Exception as e:
+                    print(f"Error processing file {rel_path}: {e}")
+                    content = ""
+
+                terms = Counter(_tokenize(content))
+                conn.execute("DELETE FROM postings WHERE path = ?", (path,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO files (path, relpath, size, mtime_ns, length, content) VALUES (?, ?, ?, ?, ?, ?)",
+                    (path, rel_path, stat.st_size, stat.st_mtime_ns, sum(terms.values()), content),
+                )
+                conn.executemany(
+                    "INSERT INTO postings (term, path, tf) VALUES (?, ?, ?)",
+                    [(term, path, tf) for term, tf in terms.items()],
+                )
+                # Commit each file, so the write lock is never held while the next one is extracted
+                conn.commit()
+                stats["updated" if path in known else "added"] += 1
+
+            for path in set(known) - seen:
+                conn.execute("DELETE FROM postings WHERE path = ?", (path,))
+                conn.execute("DELETE FROM files WHERE path = ?", (path,))
+                stats["removed"] += 1
+            conn.commit()
+        finally:
+            conn.close()
+    return stats
+
+def search_index(query: str, data_dir="data/", index_path=INDEX_PATH, max_results=MAX_RESULTS) -> list:
+    """
+    Ranks indexed files against the query with BM25 over the inverted index.
+    Returns a list of (rel_path, content, score) tuples, best match first.
+    An empty query returns the most recently modified files.
+    """
+    root_prefix = os.path.join(os.path.abspath(data_dir), "")
+    conn = _connect(index_path)
+    try:
+        scope = "substr(f.path, 1, ?) = ? AND f.length > 0"
+        terms = set(_tokenize(query))
+        if not terms:
+            rows = conn.execute(
+                f"SELECT f.relpath, f.content FROM files f WHERE {scope} ORDER BY f.mtime_ns DESC LIMIT ?",
+                (len(root_prefix), root_prefix, max_results),
+            ).fetchall()
+            return [(rel_path, content, 0.0) for rel_path, content in rows]
+
+        n_docs, avg_len = conn.execute(
+            f"SELECT COUNT(*), AVG(f.length) FROM files f WHERE {scope}",
+            (len(root_prefix), root_prefix),
+        ).fetchone()
+        if not n_docs:
+            return []
+
+        scores = Counter()
+        for term in terms:
+            postings = conn.execute(
+                f"SELECT p.path, p.tf, f.length FROM postings p JOIN files f ON f.path = p.path WHERE p.term = ? AND {scope}",
+                (term, len(root_prefix), root_prefix),
+            ).fetchall()
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for path, tf, length in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len)
+                scores[path] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        results = []
+        for path, score in scores.most_common(max_results):
+            rel_path, content = conn.execute("SELECT relpath, content FROM files WHERE path = ?", (path,)).fetchone()
+            results.append((rel_path, content, score))
+        return results
+    finally:
+        conn.close()
+
+def read_files(query: str, data_dir="data/", max_results=MAX_RESULTS) -> list:
+    """
+    Returns the .pdf and .txt files in the data directory that best match the query as LangChain Document objects.
+    The corpus is indexed incrementally, so only files added or changed since the last call are parsed.
     """
-    docs = []
     if not os.path.exists(data_dir) or not os.listdir(data_dir):
         print(f"No files found in the '{data_dir}' directory.")
-        return docs
+        return []
 
-    for filename in os.listdir(data_dir):
-        filepath = os.path.join(data_dir, filename)
-        content = ""
-        try:
-            if filename.endswith(".txt"):
-                with open(filepath, "r", encoding="utf-8") as f:
-                    content = f.read()
-            elif filename.endswith(".pdf"):
-                with open(filepath, "rb") as f:
-                    reader = PyPDF2.PdfReader(f)
-                    for page in reader.pages:
-                        content += page.extract_text() or ""
-            
-            if content:
-                doc = Document(page_content=content, metadata={"source": filename})
-                docs.append(doc)
-        except Exception as e:
-            print(f"Error processing file {filename}: {e}")
+    stats = sync_index(data_dir)
+    print(f"Local corpus index synced: {stats}")
+
+    docs = []
+    for rel_path, content, score in search_index(query, data_dir, max_results=max_results):
+        docs.append(Document(page_content=content, metadata={"source": rel_path, "score": score}))
     return docs
@@ -1,40 +1,101 @@
 import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+import statistics
+from collections import deque
 from langsmith import traceable
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
 from typing import TypedDict, List
-from modules.rag_pipeline import query_vector_db
-from modules.gemini_llm import get_gemini_response
+import numpy as np
+from modules.rag_pipeline import query_vector_db_scored, query_vector_db_multi, get_relevance_threshold, DEFAULT_N_RESULTS
+from modules.gemini_llm import get_gemini_response, aget_gemini_response
+from modules.query_expansion import expand_query
+from utils import tracing
+
+# Use a (cached) flash call instead of heuristics to expand questions in "multi" retrieval mode
+USE_LLM_QUERY_EXPANSION = os.getenv("AIRA_LLM_QUERY_EXPANSION", "false").lower() == "true"
+
+NO_RELEVANT_DOCUMENTS_RESPONSE = "I couldn't find information relevant to your question in your documents."
+
+# Recent retrieval latencies (ms) per retrieval mode, used to report the cost of multi-query retrieval
+_retrieval_latencies = {"single": deque(maxlen=500), "multi": deque(maxlen=500)}
 
 # Define the state for our graph
 class AgentState(TypedDict):
     query: str
     session_id: str
     model_name: str # Added to carry the selected model
-    context: List[str]
+    retrieval_mode: str # "single" or "multi"
+    n_results: int # Chunks to retrieve; the pipeline default if unset
+    hits: List[dict] # Scored retrieval results
+    context: List[str] # Hits that passed relevance grading
     response: str
 
 # --- Graph Nodes ---
 
+@tracing.traced("graph.retrieve")
 def retrieve_node(state: AgentState):
-    """Retrieves documents from the vector DB."""
+    """Retrieves documents from the vector DB, optionally fanning out over expanded sub-queries."""
     print(f"---Retrieving documents for query: '{state['query']}'---")
-    state['context'] = query_vector_db(state['query'], collection_name=state['session_id'])
+    mode = state.get("retrieval_mode") or "single"
+    n_results = state.get("n_results") or DEFAULT_N_RESULTS
+    started = time.perf_counter()
+    if mode == "multi":
+        sub_queries = expand_query(state['query'], use_llm=USE_LLM_QUERY_EXPANSION)
+        print(f"---Expanded into {len(sub_queries)} sub-queries: {sub_queries}---")
+        state['hits'] = query_vector_db_multi(sub_queries, collection_name=state['session_id'], n_results=n_results)
+    else:
+        mode = "single"
+        state['hits'] = query_vector_db_scored(state['query'], collection_name=state['session_id'], n_results=n_results)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    _retrieval_latencies[mode].append(elapsed_ms)
+    tracing.current_span().set(retrieval_mode=mode, hits=len(state['hits']))
+    print(f"---Retrieval ({mode}) took {elapsed_ms:.1f} ms---")
     return state
 
+def get_retrieval_latency_report() -> dict:
+    """Summarizes recent retrieval latencies per mode and the overhead of multi-query retrieval."""
+    report = {}
+    for mode, samples in _retrieval_latencies.items():
+        samples = sorted(samples)
+        if not samples:
+            report[mode] = {"count": 0}
+            continue
+        report[mode] = {
+            "count": len(samples),
+            "p50_ms": round(statistics.median(samples), 2),
+            "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+        }
+    if report["single"].get("count") and report["multi"].get("count"):
+        report["multi_overhead_p50_ms"] = round(report["multi"]["p50_ms"] - report["single"]["p50_ms"], 2)
+    return report
+
+@tracing.traced("graph.grade_documents")
 def grade_documents_node(state: AgentState):
     """
-    Grades the relevance of retrieved documents.
-    This is a simplified grader that checks if any documents were returned.
-    A more advanced implementation could use an LLM to score relevance.
+    Grades the relevance of retrieved documents by their similarity to the query.
+    Hits below the collection's calibrated threshold are dropped; if none pass, the workflow
+    answers immediately instead of paying for a generation on irrelevant context.
     """
     print("---Grading retrieved documents---")
-    if not state.get('context'):
-        print("---No documents found or context is empty.---")
-        state['response'] = "No relevant documents found to answer your query."
+    hits = state.get('hits') or []
+    threshold = get_relevance_threshold(state['session_id'])
+    similarities = np.fromiter((hit["similarity"] for hit in hits), dtype=np.float32, count=len(hits))
+    relevant = np.flatnonzero(similarities >= threshold)
+    state['context'] = [hits[i]["document"] for i in relevant]
+    tracing.current_span().set(hits=len(hits), relevant=len(state['context']), threshold=threshold)
+    if not state['context']:
+        best = f"{similarities.max():.3f}" if len(hits) else "n/a"
+        print(f"---No documents above relevance threshold {threshold:.3f} (best {best}).---")
+        state['response'] = NO_RELEVANT_DOCUMENTS_RESPONSE
         return state
-    print("---Documents found, proceeding to generation.---")
+    print(f"---{len(state['context'])}/{len(hits)} documents above relevance threshold {threshold:.3f}, proceeding to generation.---")
     return state
 
+@tracing.traced("graph.generate")
 def generate_node(state: AgentState):
     """Calls Gemini to generate a response based on the context."""
     model_name = state.get("model_name", "gemini-1.5-flash") # Default to flash
@@ -44,6 +105,24 @@ def generate_node(state: AgentState):
     state['response'] = get_gemini_response(state['query'], context_list, model_name=model_name)
     return state
 
+# Async variants. Retrieval and grading touch Chroma synchronously, so they run in a worker thread;
+# generation awaits Gemini directly so many chats can share one event loop.
+
+async def aretrieve_node(state: AgentState):
+    return await asyncio.to_thread(retrieve_node, state)
+
+async def agrade_documents_node(state: AgentState):
+    return await asyncio.to_thread(grade_documents_node, state)
+
+@tracing.traced("graph.generate")
+async def agenerate_node(state: AgentState):
+    """Async variant of generate_node."""
+    model_name = state.get("model_name", "gemini-1.5-flash") # Default to flash
+    print(f"---Generating response with {model_name}---")
+    context_list = [str(item) for item in state.get('context', [])]
+    state['response'] = await aget_gemini_response(state['query'], context_list, model_name=model_name)
+    return state
+
 def decide_next_node(state: AgentState):
     """Determines the next step based on whether relevant documents were found."""
     if not state.get('context'):
@@ -55,10 +134,10 @@ def decide_next_node(state: AgentState):
 
 workflow = StateGraph(AgentState)
 
-# Add the nodes
-workflow.add_node("retrieve", retrieve_node)
-workflow.add_node("grade_documents", grade_documents_node)
-workflow.add_node("generate", generate_node)
+# Add the nodes. Each has a sync and an async implementation, so the graph supports both invoke and ainvoke.
+workflow.add_node("retrieve", RunnableLambda(retrieve_node, afunc=aretrieve_node))
+workflow.add_node("grade_documents", RunnableLambda(grade_documents_node, afunc=agrade_documents_node))
+workflow.add_node("generate", RunnableLambda(generate_node, afunc=agenerate_node))
 
 # Set the entrypoint
 workflow.set_entry_point("retrieve")
@@ -78,11 +157,98 @@ workflow.add_edge("generate", END)
 # Compile the graph
 app = workflow.compile()
 
+# Optional SQLite checkpointer: with it, an interrupted or retried turn resumes from its last completed node
+CHECKPOINT_DB_PATH = os.getenv("AIRA_CHECKPOINT_DB")
+_checkpointed_app = None
+_checkpoint_conn = None
+_checkpointed_app_lock = asyncio.Lock()
+
+async def _get_checkpointed_app():
+    global _checkpointed_app, _checkpoint_conn
+    async with _checkpointed_app_lock:
+        if _checkpointed_app is None:
+            import aiosqlite
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+            os.makedirs(os.path.dirname(CHECKPOINT_DB_PATH) or ".", exist_ok=True)
+            _checkpoint_conn = await aiosqlite.connect(CHECKPOINT_DB_PATH)
+            _checkpointed_app = workflow.compile(checkpointer=AsyncSqliteSaver(_checkpoint_conn))
+    return _checkpointed_app
+
+async def close_checkpointer():
+    """Closes the checkpoint database connection, if one was opened."""
+    global _checkpointed_app, _checkpoint_conn
+    async with _checkpointed_app_lock:
+        if _checkpoint_conn is not None:
+            await _checkpoint_conn.close()
+        _checkpointed_app, _checkpoint_conn = None, None
+
+def delete_session_checkpoints(session_id: str) -> int:
+    """
+    Deletes every checkpointed turn of a session (threads `<session_id>:...`), so the checkpoint database
+    does not outlive deleted or evicted sessions. Returns the number of checkpoints removed.
+    """
+    if not CHECKPOINT_DB_PATH or not os.path.exists(CHECKPOINT_DB_PATH):
+        return 0
+    prefix = f"{session_id}:"
+    conn = sqlite3.connect(CHECKPOINT_DB_PATH, timeout=30)
+    try:
+        with conn:
+            # substr instead of LIKE, so "%" and "_" in session ids are not wildcards
+            deleted = conn.execute("DELETE FROM checkpoints WHERE substr(thread_id, 1, ?) = ?", (len(prefix), prefix)).rowcount
+            conn.execute("DELETE FROM writes WHERE substr(thread_id, 1, ?) = ?", (len(prefix), prefix))
+        return deleted
+    except sqlite3.OperationalError as e:
+        print(f"Could not delete checkpoints for session '{session_id}': {e}")
+        return 0
+    finally:
+        conn.close()
+
+def _thread_id(session_id: str, query: str, model_name: str, retrieval_mode: str, turn_id: str = None,
+               n_results: int = None) -> str:
+    if turn_id:
+        return f"{session_id}:{turn_id}"
+    settings = f"{query}\n{model_name}\n{retrieval_mode}" + (f"\n{n_results}" if n_results else "")
+    turn_key = hashlib.sha1(settings.encode("utf-8")).hexdigest()[:16]
+    return f"{session_id}:{turn_key}"
+
 @traceable(name="LangGraph_RAG_Workflow")
-def run_graph_workflow(query: str, session_id: str, model_name: str = "gemini-1.5-flash"):
+@tracing.traced("graph.run")
+def run_graph_workflow(query: str, session_id: str, model_name: str = "gemini-1.5-flash", retrieval_mode: str = "single",
+                       n_results: int = None):
     """
-    Runs the LangGraph RAG workflow with a specified model.
+    Runs the LangGraph RAG workflow with a specified model and retrieval mode ("single" or "multi").
     """
-    inputs = {"query": query, "session_id": session_id, "model_name": model_name}
+    inputs = {"query": query, "session_id": session_id, "model_name": model_name, "retrieval_mode": retrieval_mode,
+              "n_results": n_results}
     final_state = app.invoke(inputs)
     return final_state.get("response", "No response generated.")
+
+@traceable(name="LangGraph_RAG_Workflow_Async")
+@tracing.traced("graph.run")
+async def arun_graph_workflow(query: str, session_id: str, model_name: str = "gemini-1.5-flash",
+                              retrieval_mode: str = "single", turn_id: str = None, n_results: int = None):
+    """
+    Async variant of run_graph_workflow, for use from async routes.
+    When AIRA_CHECKPOINT_DB is set, each turn is checkpointed in SQLite under a thread keyed by the
+    session id and the turn (`turn_id` if given, otherwise a hash of the query and settings).
+    A turn that was interrupted resumes from its last completed node instead of re-running retrieval,
+    and a turn with an explicit `turn_id` that already completed returns its stored response.
+    """
+    inputs = {"query": query, "session_id": session_id, "model_name": model_name, "retrieval_mode": retrieval_mode,
+              "n_results": n_results}
+    if not CHECKPOINT_DB_PATH:
+        final_state = await app.ainvoke(inputs)
+        return final_state.get("response", "No response generated.")
+
+    checkpointed_app = await _get_checkpointed_app()
+    config = {"configurable": {"thread_id": _thread_id(session_id, query, model_name, retrieval_mode, turn_id, n_results)}}
+    snapshot = await checkpointed_app.aget_state(config)
+    if snapshot.next:
+        print(f"---Resuming interrupted turn at {list(snapshot.next)}---")
+        final_state = await checkpointed_app.ainvoke(None, config)
+    elif turn_id and snapshot.values.get("response"):
+        print("---Turn already completed, returning checkpointed response---")
+        final_state = snapshot.values
+    else:
+        final_state = await checkpointed_app.ainvoke(inputs, config)
+    return final_state.get("response", "No response generated.")
@@ -3,23 +3,40 @@ import uuid
 import os
 import uuid
 import json
-from fastapi import FastAPI, HTTPException
+import asyncio
+import tempfile
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, FileResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
 
-from context_router import fetch_all_context
+from context_router import fetch_context, stream_context
 from modules.rag_pipeline import process_and_store_documents, query_vector_db, delete_session_collection, collection_exists
 from modules.gemini_llm import get_gemini_response, get_model
 from utils.mcp_schema import server_info, ResearchAgentQueryInput
-from context_sources.github_docs import search_github_repos, fetch_readme_content, clone_and_read_repo_files
-from modules.memory import load_chat_history, save_chat_history
-from graphs.langgraph_workflow import run_graph_workflow
+from context_sources.github_docs import search_github_repos, fetch_readme_content, iter_repo_files
+from modules.memory import load_chat_history, append_chat_messages
+from graphs.langgraph_workflow import arun_graph_workflow, close_checkpointer, get_retrieval_latency_report
+from modules.session_store import touch_resource, cache_documents, get_cached_documents
+from modules.snapshots import export_collection, import_collection
+from modules.research_agent import research_agent_query
+from modules.batch_chat import run_chat_batch
+from modules.janitor import run_janitor_once, get_janitor_status, restore_if_archived, discard_session, is_archived, JANITOR_INTERVAL
+from utils import tracing
 from langchain.docstore.document import Document
 
 app = FastAPI()
 
-# In-memory cache for fetched documents
-document_cache = {}
+# Registered only when tracing is on, so untraced deployments pay nothing per request
+if tracing.ENABLED:
+    @app.middleware("http")
+    async def trace_requests(request: Request, call_next):
+        with tracing.span(f"{request.method} {request.url.path}", http_method=request.method, http_path=request.url.path) as s:
+            response = await call_next(request)
+            s.set(http_status=response.status_code)
+            return response
+
 
 # Pydantic Models for Request Bodies
 class FetchSourcesRequest(BaseModel):
@@ -29,11 +46,27 @@ class FetchSourcesRequest(BaseModel):
 class StartChatRequest(BaseModel):
     session_id: str
     document_ids: Optional[List[str]] = None
+    # Overrides of the index settings picked for a new session's collection ("space", "M", "construction_ef", "search_ef")
+    index_settings: Optional[Dict[str, Any]] = None
 
 class ChatRequest(BaseModel):
     session_id: str
     query: str
     model: Optional[str] = "gemini-1.5-flash"
+    # "multi" expands the question into sub-queries and fuses their results
+    retrieval_mode: Optional[str] = "single"
+    # Identifies a turn so a retried request resumes (or returns) the same checkpointed run
+    turn_id: Optional[str] = None
+    # Chunks retrieved per question (default 5)
+    n_results: Optional[int] = None
+
+class ChatBatchRequest(BaseModel):
+    session_id: str
+    queries: List[str]
+    model: Optional[str] = "gemini-1.5-flash"
+    # Evaluation runs usually should not fill the session's chat history
+    skip_history: Optional[bool] = False
+    n_results: Optional[int] = None
 
 class GenerateTitleRequest(BaseModel):
     document_ids: List[str]
@@ -41,6 +74,9 @@ class GenerateTitleRequest(BaseModel):
 class DeleteSessionRequest(BaseModel):
     session_id: str
 
+class ExportSessionRequest(BaseModel):
+    session_id: str
+
 class SearchGithubRequest(BaseModel):
     query: str
 
@@ -51,42 +87,94 @@ class FetchReadmeRequest(BaseModel):
 class ProcessGithubRepoRequest(BaseModel):
     repo_url: str
     repo_name: str
+    # Expected number of chunks, used to pick the index settings profile; overrides win over the profile
+    size_hint: Optional[int] = None
+    index_settings: Optional[Dict[str, Any]] = None
+
+async def _janitor_loop():
+    while True:
+        await asyncio.sleep(JANITOR_INTERVAL)
+        try:
+            await asyncio.to_thread(run_janitor_once)
+        except Exception as e:
+            print(f"Janitor run failed: {e}")
+
+@app.on_event("startup")
+async def startup():
+    app.state.janitor_task = asyncio.create_task(_janitor_loop())
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.janitor_task.cancel()
+    await close_checkpointer()
 
 @app.get("/")
 def get_server_info():
     """Return the server's capabilities."""
     return server_info.model_dump()
 
+def _cache_and_serialize(docs: list) -> list:
+    """Stores fetched documents in the shared document cache and returns their serializable form."""
+    serializable_docs = []
+    cached = []
+    for doc in docs:
+        doc_id = str(uuid.uuid4())
+        # Cache the original document where every server worker can find it
+        cached.append((doc_id, doc.page_content, doc.metadata))
+        
+        # Create a serializable version for the frontend
+        doc_data = {
+            "id": doc_id,
+            "title": doc.metadata.get("title", doc.metadata.get("source", "Unknown Source")),
+            "content": doc.page_content,
+            "metadata": doc.metadata
+        }
+        serializable_docs.append(doc_data)
+    cache_documents(cached)
+    return serializable_docs
+
+def _load_cached_documents(doc_ids: list) -> list:
+    return [Document(page_content=content, metadata=metadata) for _, content, metadata in get_cached_documents(doc_ids)]
+
 @app.post("/fetch_sources")
 def fetch_sources(req: FetchSourcesRequest):
-    """Fetches documents from sources and returns them without processing."""
+    """Fetches documents from sources concurrently and returns them without processing."""
     try:
-        docs = fetch_all_context(req.query, req.context_sources)
-        
-        serializable_docs = []
-        for doc in docs:
-            doc_id = str(uuid.uuid4())
-            # Store the original Document object in the cache
-            document_cache[doc_id] = doc
-            
-            # Create a serializable version for the frontend
-            doc_data = {
-                "id": doc_id,
-                "title": doc.metadata.get("title", doc.metadata.get("source", "Unknown Source")),
-                "content": doc.page_content,
-                "metadata": doc.metadata
-            }
-            serializable_docs.append(doc_data)
-
-        return {"documents": serializable_docs}
+        result = fetch_context(req.query, req.context_sources)
+        return {"documents": _cache_and_serialize(result["documents"]), "sources": result["sources"]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/fetch_sources_stream")
+async def fetch_sources_stream(req: FetchSourcesRequest):
+    """Streams fetched documents as newline-delimited JSON, one line per source as it completes."""
+    async def generate():
+        async for source_name, docs, source_report in stream_context(req.query, req.context_sources):
+            line = {"source": source_name, "documents": await asyncio.to_thread(_cache_and_serialize, docs), "report": source_report}
+            yield json.dumps(line) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@app.post("/research_agent_query")
+async def research_agent(req: ResearchAgentQueryInput):
+    """
+    One-shot research query (the MCP tool advertised at /): fetches, indexes in memory and answers in a
+    single call, streamed as newline-delimited JSON events. Nothing is cached or persisted.
+    """
+    async def generate():
+        try:
+            async for event in research_agent_query(req.query, req.context_sources):
+                yield json.dumps(event, default=str) + "\n"
+        except Exception as e:
+            yield json.dumps({"event": "error", "error": str(e)}) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
 @app.post("/generate_title_and_summary")
 def generate_title_and_summary(req: GenerateTitleRequest):
     """Generates a title and summary for a new chat session."""
     try:
-        docs_to_summarize = [document_cache[doc_id] for doc_id in req.document_ids if doc_id in document_cache]
+        docs_to_summarize = _load_cached_documents(req.document_ids)
         if not docs_to_summarize:
             raise HTTPException(status_code=404, detail="No documents found to summarize.")
 
@@ -130,8 +218,12 @@ def start_chat(req: StartChatRequest):
         if not req.session_id:
             raise HTTPException(status_code=400, detail="Session ID is required.")
 
+        # Sessions evicted by the janitor are restored from their archive transparently
+        restore_if_archived(req.session_id)
+
         # If the collection already exists, the session is ready.
         if collection_exists(req.session_id):
+            touch_resource("collection", req.session_id)
             chat_history = load_chat_history(req.session_id)
             return {"status": "success", "session_id": req.session_id, "message": "Session initialized.", "chat_history": chat_history}
 
@@ -140,7 +232,7 @@ def start_chat(req: StartChatRequest):
             raise HTTPException(status_code=400, detail="Document IDs are required to start a new session if a collection does not already exist.")
 
         # Retrieve original Document objects from the cache
-        docs_to_process = [document_cache[doc_id] for doc_id in req.document_ids if doc_id in document_cache]
+        docs_to_process = _load_cached_documents(req.document_ids)
         
         if not docs_to_process:
             raise HTTPException(status_code=400, detail="No valid documents found in cache to process. Please fetch documents first or provide valid document IDs.")
@@ -151,23 +243,24 @@ def start_chat(req: StartChatRequest):
         if not langchain_docs:
             raise HTTPException(status_code=400, detail="The selected items could not be processed as valid documents.")
 
-        process_and_store_documents(langchain_docs, collection_name=req.session_id)
+        process_and_store_documents(langchain_docs, collection_name=req.session_id, index_settings=req.index_settings)
+        touch_resource("collection", req.session_id)
 
         return {"status": "success", "session_id": req.session_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/chat")
-def chat(req: ChatRequest):
+async def chat(req: ChatRequest):
     """Handles chat queries for a specific session."""
     try:
         if not req.session_id or not req.query:
             raise HTTPException(status_code=400, detail="Session ID and query are required.")
 
-        chat_history = load_chat_history(req.session_id)
+        await asyncio.to_thread(touch_resource, "collection", req.session_id)
         
-        # Pass the selected model to the workflow
-        response_text = run_graph_workflow(req.query, req.session_id, req.model)
+        # Pass the selected model to the workflow; the graph runs on the event loop instead of holding a thread
+        response_text = await arun_graph_workflow(req.query, req.session_id, req.model, req.retrieval_mode, req.turn_id, req.n_results)
         
         # Prepare the user message, including the model used for the query
         user_message = {
@@ -176,14 +269,52 @@ def chat(req: ChatRequest):
             "metadata": {"model_used": req.model}
         }
         
-        chat_history.append(user_message)
-        chat_history.append({"role": "assistant", "content": response_text})
-        save_chat_history(req.session_id, chat_history)
+        # Appended under a lock on the history file, so concurrent turns on other workers are not lost
+        chat_history = await asyncio.to_thread(
+            append_chat_messages, req.session_id, [user_message, {"role": "assistant", "content": response_text}]
+        )
         
         return {"response": response_text, "chat_history": chat_history}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat_batch")
+async def chat_batch(req: ChatBatchRequest):
+    """
+    Answers a list of questions against one session, streamed as newline-delimited JSON events
+    as each answer completes.
+    """
+    if not req.session_id or not req.queries:
+        raise HTTPException(status_code=400, detail="Session ID and at least one query are required.")
+    await asyncio.to_thread(touch_resource, "collection", req.session_id)
+
+    async def generate():
+        try:
+            async for event in run_chat_batch(req.session_id, req.queries, req.model, req.skip_history, n_results=req.n_results):
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            yield json.dumps({"event": "error", "error": str(e)}) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@app.get("/retrieval_stats")
+def retrieval_stats():
+    """Reports recent retrieval latencies per retrieval mode, including the multi-query overhead."""
+    return get_retrieval_latency_report()
+
+@app.get("/janitor_status")
+def janitor_status():
+    """Reports the eviction settings and the result of the last janitor run."""
+    return get_janitor_status()
+
+@app.post("/run_janitor")
+def run_janitor():
+    """Runs an eviction pass immediately and reports what was reclaimed."""
+    try:
+        return run_janitor_once()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/delete_session")
 def delete_session(req: DeleteSessionRequest):
     """Deletes a specific chat session and its associated vector store."""
@@ -191,12 +322,55 @@ def delete_session(req: DeleteSessionRequest):
         if not req.session_id:
             raise HTTPException(status_code=400, detail="Session ID is required.")
 
-        delete_session_collection(req.session_id)
+        exists = collection_exists(req.session_id)
+        # An evicted session only exists as its archive
+        if not exists and not is_archived(req.session_id):
+            raise HTTPException(status_code=404, detail=f"Session '{req.session_id}' not found.")
+
+        discard_session(req.session_id)
+        if exists:
+            delete_session_collection(req.session_id)
         
         return {"status": "success", "message": f"Session '{req.session_id}' and its data deleted."}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/export_session")
+def export_session(req: ExportSessionRequest):
+    """Exports a session's index (ids, documents, metadata and embeddings) as a compact snapshot file."""
+    try:
+        if not collection_exists(req.session_id):
+            raise HTTPException(status_code=404, detail=f"Session '{req.session_id}' not found.")
+        fd, path = tempfile.mkstemp(suffix=".npz")
+        os.close(fd)
+        export_collection(req.session_id, path)
+        return FileResponse(
+            path, media_type="application/octet-stream", filename=f"{req.session_id}.npz",
+            background=BackgroundTask(os.remove, path),
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/import_session")
+async def import_session(session_id: str, request: Request):
+    """Loads a snapshot (sent as the raw request body) into the vector store as `session_id`, without re-embedding."""
+    fd, path = tempfile.mkstemp(suffix=".npz")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in request.stream():
+                f.write(chunk)
+        stats = await asyncio.to_thread(import_collection, path, session_id)
+        await asyncio.to_thread(touch_resource, "collection", session_id)
+        return {"status": "success", "stats": stats}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        os.remove(path)
+
 @app.post("/search_github_repos")
 def search_repos(req: SearchGithubRequest):
     """Searches GitHub repositories based on a query."""
@@ -230,19 +404,34 @@ def process_github_repo(req: ProcessGithubRepoRequest):
 
         clone_dir = os.path.join("data", req.repo_name)
         
-        docs_data = clone_and_read_repo_files(req.repo_url, clone_dir)
-        
-        if not docs_data:
+        # Files are streamed from the clone straight into the ingest pipeline
+        langchain_docs = (
+            Document(page_content=d["content"], metadata={"source": d["source"], "repo_name": req.repo_name})
+            for d in iter_repo_files(req.repo_url, clone_dir)
+        )
+
+        stats = process_and_store_documents(
+            langchain_docs, collection_name=req.repo_name, size_hint=req.size_hint, index_settings=req.index_settings
+        )
+        touch_resource("collection", req.repo_name)
+        touch_resource("clone", req.repo_name)
+
+        if not stats["documents"]:
             raise HTTPException(status_code=500, detail="No documents found or processed from the repository.")
 
-        langchain_docs = [Document(page_content=d["content"], metadata={"source": d["source"], "repo_name": req.repo_name}) for d in docs_data]
-
-        process_and_store_documents(langchain_docs, collection_name=req.repo_name)
-
-        return {"status": "success", "message": f"Repository '{req.repo_name}' processed and stored."}
+        return {"status": "success", "message": f"Repository '{req.repo_name}' processed and stored.", "stats": stats}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=5000)
+    from modules.rag_pipeline import CHROMA_HOST
+    workers = int(os.getenv("AIRA_WORKERS", "1"))
+    if workers > 1 and not CHROMA_HOST:
+        print("AIRA_WORKERS > 1 needs a shared Chroma server (AIRA_CHROMA_HOST); running a single worker.")
+        workers = 1
+    if workers > 1:
+        # Workers are separate processes that import the app themselves
+        uvicorn.run("mcp_server:app", host="127.0.0.1", port=5000, workers=workers)
+    else:
+        uvicorn.run(app, host="127.0.0.1", port=5000)
@@ -0,0 +1,90 @@
+import os
+import time
+import asyncio
+from modules.rag_pipeline import query_vector_db_batch, get_relevance_threshold, DEFAULT_N_RESULTS
+from modules.gemini_llm import aget_gemini_response
+from modules.memory import append_chat_messages
+from graphs.langgraph_workflow import NO_RELEVANT_DOCUMENTS_RESPONSE
+from utils import tracing
+
+# Gemini generations in flight per batch; requests are also spaced by AIRA_GEMINI_RPM if set
+BATCH_CONCURRENCY = int(os.getenv("AIRA_BATCH_CONCURRENCY", "8"))
+
+async def run_chat_batch(session_id: str, queries: list, model_name: str = "gemini-1.5-flash",
+                         skip_history: bool = False, concurrency: int = BATCH_CONCURRENCY, n_results: int = None):
+    """
+    Answers many questions against one session, yielding events for an NDJSON stream:
+      {"event": "retrieved", ...} once every question has been searched,
+      {"event": "result", "index": i, "query": ..., "response": ...} as each answer completes
+      ({"event": "error", ...} instead if its generation failed), and
+      {"event": "done", "stats": {...}} at the end.
+    Questions are embedded in one batch and searched together. Repeated questions would build the same
+    prompt, so each distinct one is generated once and its answer is reported for every index that asked it.
+    Unless `skip_history` is set, the turns are appended to the session's chat history in question order.
+    """
+    started = time.monotonic()
+    positions = {}
+    for index, query in enumerate(queries):
+        positions.setdefault(query, []).append(index)
+    unique_queries = list(positions)
+
+    with tracing.span("chat_batch.retrieve", queries=len(queries), unique_queries=len(unique_queries)):
+        hit_lists = await asyncio.to_thread(query_vector_db_batch, unique_queries, session_id, n_results or DEFAULT_N_RESULTS)
+        threshold = await asyncio.to_thread(get_relevance_threshold, session_id)
+    contexts = {
+        query: [hit["document"] for hit in hits if hit["similarity"] >= threshold]
+        for query, hits in zip(unique_queries, hit_lists)
+    }
+    stats = {"queries": len(queries), "unique_queries": len(unique_queries), "generated": 0, "no_context": 0, "errors": 0}
+    yield {"event": "retrieved", "queries": len(queries), "unique_queries": len(unique_queries),
+           "seconds": round(time.monotonic() - started, 3)}
+
+    responses = {}
+
+    def results(query: str, response: str = None, error: str = None) -> list:
+        events = []
+        for index in positions[query]:
+            if error is None:
+                responses[index] = response
+                events.append({"event": "result", "index": index, "query": query, "response": response})
+            else:
+                events.append({"event": "error", "index": index, "query": query, "error": error})
+        return events
+
+    # Questions without relevant context are answered without calling Gemini
+    for query in unique_queries:
+        if not contexts[query]:
+            stats["no_context"] += 1
+            for event in results(query, NO_RELEVANT_DOCUMENTS_RESPONSE):
+                yield event
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer(query: str):
+        async with semaphore:
+            try:
+                return query, await aget_gemini_response(query, contexts[query], model_name=model_name), None
+            except Exception as e:
+                return query, None, str(e)
+
+    tasks = [asyncio.ensure_future(answer(query)) for query in unique_queries if contexts[query]]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            query, response, error = await next_done
+            stats["errors" if error else "generated"] += 1
+            stats.setdefault("first_result", round(time.monotonic() - started, 3))
+            for event in results(query, response, error):
+                yield event
+    finally:
+        # The client went away mid-batch; don't keep generating for nobody
+        for task in tasks:
+            task.cancel()
+
+    if not skip_history and responses:
+        messages = []
+        for index in sorted(responses):
+            messages.append({"role": "user", "content": queries[index], "metadata": {"model_used": model_name, "batch": True}})
+            messages.append({"role": "assistant", "content": responses[index]})
+        await asyncio.to_thread(append_chat_messages, session_id, messages)
+    stats["elapsed"] = round(time.monotonic() - started, 3)
+    yield {"event": "done", "stats": stats}
@@ -0,0 +1,236 @@
+import os
+import re
+import ast
+from typing import Callable, Dict, List, Tuple
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+# Target chunk size in characters. Prose with no structure to split on keeps the historical overlap;
+# chunks cut at semantic boundaries (definitions, headings, pages) need little or none.
+CHUNK_SIZE = 1000
+PROSE_CHUNK_OVERLAP = 200
+PAGE_CHUNK_OVERLAP = 100
+# Markdown sections shorter than this are merged with the next one
+MIN_CHUNK_SIZE = 200
+# Separates pages in text extracted from PDFs
+PAGE_SEPARATOR = "\f"
+
+CODE_EXTENSIONS = {
+    ".js", ".jsx", ".ts", ".tsx", ".java", ".go", ".rs", ".rb", ".php", ".c", ".cc", ".cpp", ".h", ".hpp",
+    ".cs", ".kt", ".swift", ".scala", ".sh",
+}
+# Start of a top-level definition in C-like and scripting languages
+_DEFINITION_RE = re.compile(
+    r"^(?:export\s+)?(?:default\s+)?(?:(?:public|private|protected|internal|static|abstract|final|async|pub|unsafe)\s+)*"
+    r"(?:(?:function\*?|class|interface|enum|struct|trait|impl|type|def|fn|func|module|object)\s+(?:\([^)]*\)\s*)?([A-Za-z_$][\w$]*)"
+    r"|(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s*)?(?:function\b|\([^)]*\)\s*=>|\w+\s*=>))"
+)
+_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+
+_prose_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=PROSE_CHUNK_OVERLAP)
+_page_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=PAGE_CHUNK_OVERLAP)
+# Code and Markdown keep their indentation, so a chunk is exactly the lines its range names
+_line_splitter = RecursiveCharacterTextSplitter(
+    chunk_size=CHUNK_SIZE, chunk_overlap=0, separators=["\n\n", "\n", " ", ""], strip_whitespace=False
+)
+_section_splitter = RecursiveCharacterTextSplitter(
+    chunk_size=CHUNK_SIZE, chunk_overlap=PAGE_CHUNK_OVERLAP, strip_whitespace=False
+)
+
+# A segment is (text, start_line, end_line, symbol); lines are 1-based and inclusive
+Segment = Tuple[str, int, int, str]
+
+def _segment_metadata(start_line: int, end_line: int, symbol: str = None, page: int = None) -> dict:
+    # Chroma metadata values cannot be None, so absent fields are left out
+    metadata = {"start_line": start_line, "end_line": end_line}
+    if symbol:
+        metadata["symbol"] = symbol
+    if page is not None:
+        metadata["page"] = page
+    return metadata
+
+def _split_with_lines(text: str, splitter, overlap: int, first_line: int = 1) -> List[Tuple[str, int, int]]:
+    """
+    Splits text with a character splitter and recovers each chunk's line range. `overlap` is the
+    splitter's chunk overlap, which bounds how far back the next chunk can start. Newlines at the
+    edges of a chunk are dropped, so a chunk cut at line breaks is exactly its lines; one cut inside
+    a long line lies within them.
+    """
+    pieces = []
+    offset = 0
+    for chunk in splitter.split_text(text):
+        position = text.find(chunk, max(0, offset - overlap))
+        if position < 0:
+            position = offset
+        offset = position + len(chunk)
+        position += len(chunk) - len(chunk.lstrip("\n"))
+        chunk = chunk.strip("\n")
+        if not chunk:
+            continue
+        start = first_line + text.count("\n", 0, position)
+        pieces.append((chunk, start, start + chunk.count("\n")))
+    return pieces
+
+def _split_segment(segment: Segment, splitter, overlap: int) -> List[Tuple[str, dict]]:
+    """Splits an oversized segment, folding a short leading piece (e.g. a lone heading) into the next one."""
+    text, start, _, symbol = segment
+    pieces = _split_with_lines(text, splitter, overlap, start)
+    if len(pieces) > 1 and len(pieces[0][0]) < MIN_CHUNK_SIZE:
+        lines = text.split("\n")
+        first, second = pieces[0], pieces[1]
+        pieces[:2] = [("\n".join(lines[first[1] - start:second[2] - start + 1]), first[1], second[2])]
+    return [(piece, _segment_metadata(piece_start, piece_end, symbol)) for piece, piece_start, piece_end in pieces]
+
+def _pack(segments: List[Segment], merge_below: int, splitter=_line_splitter, overlap: int = 0) -> List[Tuple[str, dict]]:
+    """
+    Merges consecutive segments while the chunk is shorter than `merge_below` (and fits in CHUNK_SIZE),
+    and splits oversized segments with `splitter` (whose chunk overlap is `overlap`), so chunks only
+    break inside a segment that cannot fit. Blank segments are kept inside chunks so that a chunk's
+    text is the lines between its start_line and end_line; only chunks that are entirely blank are dropped.
+    """
+    chunks = []
+    group = []
+
+    def flush():
+        if group:
+            text = "\n".join(s[0] for s in group)
+            if not text.strip():
+                group.clear()
+                return
+            symbols = ", ".join(dict.fromkeys(s[3] for s in group if s[3]))
+            chunks.append((text, _segment_metadata(group[0][1], group[-1][2], symbols)))
+            group.clear()
+
+    for segment in segments:
+        text = segment[0]
+        if len(text) > CHUNK_SIZE:
+            flush()
+            chunks.extend(_split_segment(segment, splitter, overlap))
+            continue
+        if group and sum(len(s[0]) + 1 for s in group) + len(text) > CHUNK_SIZE:
+            flush()
+        group.append(segment)
+        if sum(len(s[0]) + 1 for s in group) >= merge_below:
+            flush()
+    flush()
+    return chunks
+
+def _line_segments(lines: List[str], boundaries: List[Tuple[int, str]]) -> List[Segment]:
+    """Cuts lines into segments starting at each (0-based line index, symbol) boundary."""
+    segments = []
+    starts = [(0, None)] + [b for b in boundaries if b[0] > 0]
+    if boundaries and boundaries[0][0] == 0:
+        starts[0] = boundaries[0]
+    for (start, symbol), (end, _) in zip(starts, starts[1:] + [(len(lines), None)]):
+        if end > start:
+            segments.append(("\n".join(lines[start:end]), start + 1, end, symbol))
+    return segments
+
+def chunk_python(text: str) -> List[Tuple[str, dict]]:
+    """Splits Python source at top-level function and class definitions (methods for large classes)."""
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return chunk_code(text)
+    lines = text.split("\n")
+    boundaries = []
+    for node in tree.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        start = min([node.lineno] + [d.lineno for d in node.decorator_list]) - 1
+        node_size = sum(len(line) + 1 for line in lines[start:node.end_lineno])
+        boundaries.append((start, node.name))
+        if isinstance(node, ast.ClassDef) and node_size > CHUNK_SIZE:
+            # Large classes are cut again at each method
+            for child in node.body:
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    child_start = min([child.lineno] + [d.lineno for d in child.decorator_list]) - 1
+                    boundaries.append((child_start, f"{node.name}.{child.name}"))
+        # Module-level code after a definition starts a new, unnamed segment
+        boundaries.append((node.end_lineno, None))
+    boundaries = sorted(dict(boundaries).items())
+    return _pack(_line_segments(lines, boundaries), merge_below=CHUNK_SIZE)
+
+def chunk_code(text: str) -> List[Tuple[str, dict]]:
+    """Splits source code in other languages at top-level definitions found with a regex."""
+    lines = text.split("\n")
+    boundaries = []
+    for i, line in enumerate(lines):
+        # Only unindented lines start a top-level definition
+        if line[:1].isspace():
+            continue
+        match = _DEFINITION_RE.match(line)
+        if match:
+            boundaries.append((i, match.group(1) or match.group(2)))
+    return _pack(_line_segments(lines, boundaries), merge_below=CHUNK_SIZE)
+
+def chunk_markdown(text: str) -> List[Tuple[str, dict]]:
+    """Splits Markdown at headings (outside code fences); each chunk's symbol is its heading path."""
+    lines = text.split("\n")
+    boundaries = []
+    path = []
+    in_fence = False
+    for i, line in enumerate(lines):
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+            continue
+        match = None if in_fence else _HEADING_RE.match(line)
+        if match:
+            level = len(match.group(1))
+            path = path[:level - 1] + [match.group(2)]
+            boundaries.append((i, " > ".join(path)))
+    # Sections stay separate unless they are too short to stand alone
+    return _pack(_line_segments(lines, boundaries), merge_below=MIN_CHUNK_SIZE, splitter=_section_splitter,
+                 overlap=PAGE_CHUNK_OVERLAP)
+
+def chunk_pdf(text: str) -> List[Tuple[str, dict]]:
+    """Splits PDF text page by page (pages are separated by form feeds), recording the page number."""
+    pages = text.split(PAGE_SEPARATOR)
+    if len(pages) == 1:
+        return chunk_prose(text)
+    chunks = []
+    for number, page in enumerate(pages, start=1):
+        for piece, start, end in _split_with_lines(page, _page_splitter, PAGE_CHUNK_OVERLAP):
+            if piece.strip():
+                chunks.append((piece, _segment_metadata(start, end, page=number)))
+    return chunks
+
+def chunk_prose(text: str) -> List[Tuple[str, dict]]:
+    """Default character splitter for text with no structure to follow."""
+    return [(piece, _segment_metadata(start, end)) for piece, start, end in _split_with_lines(text, _prose_splitter, PROSE_CHUNK_OVERLAP)]
+
+# Chunkers by file extension of the document's source, then by source type
+CHUNKERS: Dict[str, Callable[[str], List[Tuple[str, dict]]]] = {
+    ".py": chunk_python,
+    ".md": chunk_markdown,
+    ".markdown": chunk_markdown,
+    ".pdf": chunk_pdf,
+    **{extension: chunk_code for extension in CODE_EXTENSIONS},
+}
+SOURCE_TYPE_CHUNKERS: Dict[str, Callable[[str], List[Tuple[str, dict]]]] = {
+    "arxiv_api": chunk_pdf,
+    "github_docs": chunk_markdown,
+}
+
+def register_chunker(key: str, chunker: Callable[[str], List[Tuple[str, dict]]]):
+    """Registers a chunker for a file extension (".ext") or a source type."""
+    if key.startswith("."):
+        CHUNKERS[key.lower()] = chunker
+    else:
+        SOURCE_TYPE_CHUNKERS[key] = chunker
+
+def get_chunker(metadata: dict) -> Callable[[str], List[Tuple[str, dict]]]:
+    extension = os.path.splitext(str(metadata.get("source", "")))[1].lower()
+    if extension in CHUNKERS:
+        return CHUNKERS[extension]
+    return SOURCE_TYPE_CHUNKERS.get(metadata.get("source_type"), chunk_prose)
+
+def chunk_document(doc) -> List[Tuple[str, dict]]:
+    """
+    Splits a Document with the chunker registered for its file extension or source type.
+    Returns (chunk text, metadata) pairs; each chunk's metadata is the document's metadata plus
+    start_line/end_line and, where known, the symbol (definition or heading path) and page.
+    """
+    return [
+        (text, {**doc.metadata, **chunk_metadata})
+        for text, chunk_metadata in get_chunker(doc.metadata)(doc.page_content)
+    ]
@@ -1,6 +1,9 @@
 import os
+import time
+import asyncio
 import google.generativeai as genai
 from dotenv import load_dotenv
+from utils import tracing
 
 # Load environment variables from .env file
 load_dotenv()
@@ -14,6 +17,10 @@ genai.configure(api_key=api_key)
 # Model cache
 _models = {}
 
+# Client-side cap on async Gemini requests per minute in this process; 0 disables it
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("AIRA_GEMINI_RPM", "0"))
+_next_request_at = 0.0
+
 def get_model(model_name: str = "gemini-1.5-flash"):
     """
     Returns a specific Gemini model instance.
@@ -25,10 +32,8 @@ def get_model(model_name: str = "gemini-1.5-flash"):
         _models[model_name] = genai.GenerativeModel(model_name_for_api)
     return _models[model_name]
 
-def get_gemini_response(query: str, context: list, model_name: str = "gemini-1.5-flash", chat_history: list = None) -> str:
-    """
-    Generates a response from the Gemini LLM based on the query, context, and specified model.
-    """
+def build_prompt(query: str, context: list) -> str:
+    """Builds the RAG prompt from the query and a list of context strings."""
     context_str = "\n".join(map(str, context))
     
     prompt = f"""Let's answer the following research query step by step.
@@ -37,11 +42,78 @@ Context:
 {context_str}
 
 Answer:"""
+    return prompt
+
+def _usage_attributes(response) -> dict:
+    """Token counts reported by the API, for tracing."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return {}
+    return {
+        "prompt_tokens": getattr(usage, "prompt_token_count", None),
+        "completion_tokens": getattr(usage, "candidates_token_count", None),
+        "total_tokens": getattr(usage, "total_token_count", None),
+    }
+
+async def _wait_for_rate_limit():
+    """Spaces async requests evenly so they stay under GEMINI_REQUESTS_PER_MINUTE."""
+    global _next_request_at
+    if GEMINI_REQUESTS_PER_MINUTE <= 0:
+        return
+    # No await between reading and reserving the slot, so concurrent callers on the loop get distinct slots
+    now = time.monotonic()
+    slot = max(now, _next_request_at)
+    _next_request_at = slot + 60.0 / GEMINI_REQUESTS_PER_MINUTE
+    if slot > now:
+        await asyncio.sleep(slot - now)
+
+def get_gemini_response(query: str, context: list, model_name: str = "gemini-1.5-flash", chat_history: list = None) -> str:
+    """
+    Generates a response from the Gemini LLM based on the query, context, and specified model.
+    """
+    prompt = build_prompt(query, context)
 
     try:
         model = get_model(model_name)
-        response = model.generate_content(prompt)
+        with tracing.span("gemini.generate", model=model_name, prompt_characters=len(prompt)) as s:
+            response = model.generate_content(prompt)
+            s.set(**_usage_attributes(response))
         return response.text
     except Exception as e:
         print(f"---GEMINI API ERROR for model {model_name}: {e}---")
         raise e
+
+async def aget_gemini_response(query: str, context: list, model_name: str = "gemini-1.5-flash", chat_history: list = None) -> str:
+    """
+    Async variant of get_gemini_response; awaits the API call instead of blocking a thread.
+    """
+    prompt = build_prompt(query, context)
+
+    try:
+        model = get_model(model_name)
+        await _wait_for_rate_limit()
+        with tracing.span("gemini.generate", model=model_name, prompt_characters=len(prompt)) as s:
+            response = await model.generate_content_async(prompt)
+            s.set(**_usage_attributes(response))
+        return response.text
+    except Exception as e:
+        print(f"---GEMINI API ERROR for model {model_name}: {e}---")
+        raise e
+
+async def astream_gemini_response(query: str, context: list, model_name: str = "gemini-1.5-flash"):
+    """
+    Streams a response from the Gemini LLM, yielding text fragments as they are generated.
+    """
+    prompt = build_prompt(query, context)
+
+    try:
+        model = get_model(model_name)
+        await _wait_for_rate_limit()
+        with tracing.span("gemini.generate", model=model_name, prompt_characters=len(prompt), stream=True) as s:
+            response = await model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                yield chunk.text
+            s.set(**_usage_attributes(response))
+    except Exception as e:
+        print(f"---GEMINI API ERROR for model {model_name}: {e}---")
+        raise e
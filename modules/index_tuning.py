@@ -0,0 +1,192 @@
+"""
+Recall/latency calibration of a collection's ANN (HNSW) index.
+
+A sample of the collection's embeddings is loaded, a set of them is held out as queries, and the exact
+top-k neighbours of each query are computed by brute force with numpy. The rest of the sample is then
+indexed into temporary collections, one per (M, construction_ef) pair, and searched at every search_ef,
+recording recall@k against the exact neighbours and per-query latency. Of the settings that reach the
+target recall and are within noise of the fastest, the current build (or else the cheapest) is stored
+in the collection's metadata as its recommendation; --apply also puts it into effect (search_ef in
+place, M or construction_ef by rebuilding the collection from a snapshot).
+
+Usage: python -m modules.index_tuning <collection> [--k 5] [--search-ef 16 32 64 128 256] [--m 16 32]
+                                      [--construction-ef 100 200] [--target-recall 0.95] [--apply]
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import argparse
+import tempfile
+import numpy as np
+from modules.rag_pipeline import (
+    client, get_index_settings, index_metadata, set_search_ef, update_collection_metadata,
+)
+from modules.snapshots import export_collection, import_collection, _max_batch_size
+
+SEARCH_EF_GRID = [16, 32, 64, 128, 256]
+TARGET_RECALL = 0.95
+CALIBRATION_QUERIES = 200
+# Rows indexed per temporary collection; recall measured on a sample is an upper bound for the full collection
+CALIBRATION_SAMPLE_SIZE = 20000
+PAGE_SIZE = 5000
+# Another setting must beat the fastest by more than this (relative, and in ms) to count as faster
+LATENCY_MARGIN = 0.10
+LATENCY_MARGIN_MS = 0.1
+
+def _load_sample(collection, limit: int) -> np.ndarray:
+    embeddings = []
+    offset = 0
+    while offset < limit:
+        page = collection.get(limit=min(PAGE_SIZE, limit - offset), offset=offset, include=["embeddings"])
+        if not page["ids"]:
+            break
+        embeddings.append(np.asarray(page["embeddings"], dtype=np.float32))
+        offset += len(page["ids"])
+    return np.concatenate(embeddings) if embeddings else np.zeros((0, 0), dtype=np.float32)
+
+def _exact_neighbors(base: np.ndarray, queries: np.ndarray, k: int, space: str) -> np.ndarray:
+    """Indices of the exact top-k rows of `base` for each query, under the index's distance metric."""
+    if space == "cosine":
+        base = base / (np.linalg.norm(base, axis=1, keepdims=True) + 1e-12)
+        queries = queries / (np.linalg.norm(queries, axis=1, keepdims=True) + 1e-12)
+    if space == "l2":
+        # ||q - b||^2 ranks like ||b||^2 - 2 q.b
+        scores = -((base * base).sum(axis=1)[None, :] - 2.0 * queries @ base.T)
+    else:
+        scores = queries @ base.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+
+def _measure(collection, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        results = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+        latencies.append((time.perf_counter() - started) * 1000)
+        found = {int(i) for i in results["ids"][0]}
+        recalls.append(len(found & set(expected.tolist())) / k)
+    latencies.sort()
+    return {
+        "recall": round(float(np.mean(recalls)), 4),
+        "p50_ms": round(latencies[len(latencies) // 2], 3),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+    }
+
+def _recommend(results: list, target_recall: float, current: dict) -> dict:
+    """
+    Among settings that reach the target recall, those within LATENCY_MARGIN of the fastest count as
+    equally fast, since p50s that close are measurement noise. The collection's current M and
+    construction_ef are kept if they are among them (no rebuild); otherwise the cheapest build wins
+    (lower M, then construction_ef, then search_ef). If nothing reaches the target, the most accurate.
+    """
+    good = [r for r in results if r["recall"] >= target_recall]
+    if not good:
+        return max(results, key=lambda r: (r["recall"], -r["p50_ms"]))
+    fastest = min(r["p50_ms"] for r in good)
+    tolerance = max(fastest * LATENCY_MARGIN, LATENCY_MARGIN_MS)
+    equally_fast = [r for r in good if r["p50_ms"] <= fastest + tolerance]
+    unchanged = [r for r in equally_fast if r["M"] == current["M"] and r["construction_ef"] == current["construction_ef"]]
+    return min(unchanged or equally_fast, key=lambda r: (r["M"], r["construction_ef"], r["search_ef"]))
+
+def calibrate_index(collection_name: str, k: int = 5, n_queries: int = CALIBRATION_QUERIES,
+                    sample_size: int = CALIBRATION_SAMPLE_SIZE, m_values: list = None,
+                    construction_ef_values: list = None, search_ef_values: list = None,
+                    target_recall: float = TARGET_RECALL) -> dict:
+    """
+    Measures recall@k and latency across index settings for a collection and stores the recommendation
+    in its metadata (aira_recommended_*). M and construction_ef default to the collection's current values.
+    """
+    collection = client.get_collection(name=collection_name)
+    current = get_index_settings(collection)
+    space = current["space"]
+    sample = _load_sample(collection, sample_size + n_queries)
+    n_queries = min(n_queries, len(sample) // 5)
+    if n_queries == 0 or len(sample) - n_queries < k:
+        raise ValueError(f"Collection '{collection_name}' is too small to calibrate ({len(sample)} rows)")
+    held_out = np.random.default_rng(0).permutation(len(sample))
+    queries, base = sample[held_out[:n_queries]], sample[held_out[n_queries:]]
+    truth = _exact_neighbors(base, queries, k, space)
+
+    results = []
+    batch_size = _max_batch_size()
+    for m in m_values or [current["M"] or 16]:
+        for construction_ef in construction_ef_values or [current["construction_ef"] or 100]:
+            name = f"aira_tune_{uuid.uuid4().hex[:12]}"
+            temporary = client.create_collection(
+                name=name, metadata=index_metadata({"space": space, "M": m, "construction_ef": construction_ef})
+            )
+            try:
+                started = time.monotonic()
+                for i in range(0, len(base), batch_size):
+                    temporary.add(ids=[str(j) for j in range(i, min(i + batch_size, len(base)))], embeddings=base[i:i + batch_size])
+                build_seconds = round(time.monotonic() - started, 2)
+                for search_ef in search_ef_values or SEARCH_EF_GRID:
+                    set_search_ef(temporary, search_ef)
+                    result = {"M": m, "construction_ef": construction_ef, "search_ef": search_ef, "build_seconds": build_seconds}
+                    result.update(_measure(temporary, queries, truth, k))
+                    print(json.dumps(result))
+                    results.append(result)
+            finally:
+                client.delete_collection(name=name)
+
+    recommended = _recommend(results, target_recall, current)
+    update_collection_metadata(collection, {
+        "aira_recommended_M": recommended["M"],
+        "aira_recommended_construction_ef": recommended["construction_ef"],
+        "aira_recommended_search_ef": recommended["search_ef"],
+        "aira_recommended_recall": recommended["recall"],
+        "aira_calibration_k": k,
+    })
+    return {"collection": collection_name, "current": current, "sample": len(base), "queries": n_queries, "k": k,
+            "target_recall": target_recall, "results": results, "recommended": recommended}
+
+def apply_recommendation(collection_name: str, recommended: dict) -> dict:
+    """
+    Puts recommended settings into effect. search_ef changes in place; a different M or construction_ef
+    needs a new graph, so the collection is exported and re-imported with the new settings. The snapshot
+    is removed only once the import succeeds; if it fails, its path is printed so the collection can be restored.
+    """
+    collection = client.get_collection(name=collection_name)
+    current = get_index_settings(collection)
+    if recommended["M"] == current["M"] and recommended["construction_ef"] == current["construction_ef"]:
+        set_search_ef(collection, recommended["search_ef"])
+        return {"collection": collection_name, "rebuilt": False, "search_ef": recommended["search_ef"]}
+    path = os.path.join(tempfile.mkdtemp(), f"{collection_name}.npz")
+    try:
+        export_collection(collection_name, path)
+    except Exception:
+        # The collection is untouched; only the partial snapshot goes
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+        raise
+    try:
+        stats = import_collection(path, collection_name, index_settings={
+            key: recommended[key] for key in ("M", "construction_ef", "search_ef")
+        })
+    except Exception:
+        # import_collection replaces the collection, so the snapshot may now be its only copy
+        print(f"Rebuilding '{collection_name}' failed; its snapshot is kept at {path}. "
+              f"Restore it with: python -m modules.snapshots import {path} {collection_name}")
+        raise
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+    return {"collection": collection_name, "rebuilt": True, **stats}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("collection")
+    parser.add_argument("--k", type=int, default=5, help="Neighbours per query, as retrieved for a chat turn")
+    parser.add_argument("--queries", type=int, default=CALIBRATION_QUERIES)
+    parser.add_argument("--sample", type=int, default=CALIBRATION_SAMPLE_SIZE, help="Rows indexed per setting")
+    parser.add_argument("--m", type=int, nargs="+", help="M values to build (default: the collection's)")
+    parser.add_argument("--construction-ef", type=int, nargs="+", help="construction_ef values to build (default: the collection's)")
+    parser.add_argument("--search-ef", type=int, nargs="+", default=SEARCH_EF_GRID)
+    parser.add_argument("--target-recall", type=float, default=TARGET_RECALL)
+    parser.add_argument("--apply", action="store_true", help="Apply the recommended settings to the collection")
+    args = parser.parse_args()
+
+    report = calibrate_index(args.collection, args.k, args.queries, args.sample, args.m, args.construction_ef,
+                             args.search_ef, args.target_recall)
+    print(json.dumps({key: value for key, value in report.items() if key != "results"}, indent=2))
+    if args.apply:
+        print(json.dumps(apply_recommendation(args.collection, report["recommended"])))
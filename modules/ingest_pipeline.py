@@ -0,0 +1,163 @@
+import time
+import queue
+import hashlib
+import threading
+from typing import Callable, Iterable
+from utils import tracing
+
+# Stage concurrency and buffering. Queues are bounded so a slow stage applies
+# backpressure upstream and only a few batches are ever held in memory.
+SPLIT_WORKERS = 2
+EMBED_WORKERS = 1
+STORE_WORKERS = 1
+QUEUE_SIZE = 8
+EMBED_BATCH_SIZE = 64
+
+# Marks the end of a stage's input
+_DONE = object()
+
+def _put(out_queue: queue.Queue, item, stop: threading.Event):
+    """Blocking put that gives up once the pipeline is stopping."""
+    while not stop.is_set():
+        try:
+            out_queue.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+def _read_stage(docs: Iterable, out_queue: queue.Queue, stats: dict, errors: list, stop: threading.Event):
+    try:
+        for doc in docs:
+            if stop.is_set():
+                break
+            # Only Document-like objects with page_content can be chunked
+            if hasattr(doc, "page_content"):
+                stats["documents"] += 1
+                _put(out_queue, doc, stop)
+    except Exception as e:
+        errors.append(e)
+        stop.set()
+
+def _split_stage(split_fn: Callable, batch_size: int, id_field: str, in_queue: queue.Queue, out_queue: queue.Queue,
+                 stats: dict, errors: list, stop: threading.Event):
+    batch = []
+    while True:
+        doc = in_queue.get()
+        if doc is _DONE:
+            break
+        if stop.is_set():
+            continue # Drain so upstream never blocks
+        try:
+            with tracing.span("chunk", source=doc.metadata.get(id_field), characters=len(doc.page_content)) as s:
+                chunks = split_fn(doc)
+                s.set(chunks=len(chunks))
+            # Generate unique IDs for each chunk to avoid collisions. Documents without an id (e.g. arXiv
+            # papers) are keyed by their content, so they neither collide nor overwrite each other.
+            source_id = doc.metadata.get(id_field)
+            if source_id is None:
+                source_id = "doc_" + hashlib.sha1(doc.page_content.encode("utf-8", errors="ignore")).hexdigest()[:16]
+            for i, (chunk, metadata) in enumerate(chunks):
+                batch.append((f"{source_id}_{i}", chunk, metadata))
+            while len(batch) >= batch_size:
+                _put(out_queue, batch[:batch_size], stop)
+                batch = batch[batch_size:]
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+    if batch and not stop.is_set():
+        _put(out_queue, batch, stop)
+
+def _embed_stage(embed_fn: Callable, in_queue: queue.Queue, out_queue: queue.Queue,
+                 stats: dict, errors: list, stop: threading.Event):
+    while True:
+        batch = in_queue.get()
+        if batch is _DONE:
+            break
+        if stop.is_set():
+            continue
+        try:
+            embeddings = embed_fn([text for _, text, _ in batch])
+            _put(out_queue, (batch, embeddings), stop)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+def _store_stage(store_fn: Callable, in_queue: queue.Queue, stats: dict, errors: list, stop: threading.Event,
+                 lock: threading.Lock):
+    while True:
+        item = in_queue.get()
+        if item is _DONE:
+            break
+        if stop.is_set():
+            continue
+        batch, embeddings = item
+        try:
+            # Identical documents produce the same chunk ids; a batch may hold each id only once
+            unique = {chunk_id: i for i, (chunk_id, _, _) in enumerate(batch)}
+            if len(unique) < len(batch):
+                keep = sorted(unique.values())
+                batch, embeddings = [batch[i] for i in keep], [embeddings[i] for i in keep]
+            store_fn(
+                ids=[chunk_id for chunk_id, _, _ in batch],
+                documents=[text for _, text, _ in batch],
+                metadatas=[metadata for _, _, metadata in batch],
+                embeddings=embeddings,
+            )
+            with lock:
+                stats["chunks"] += len(batch)
+                stats["batches"] += 1
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+def _start(target, count: int, *args) -> list:
+    # Each stage thread gets its own copy of the caller's trace context
+    threads = [threading.Thread(target=tracing.propagate(target), args=args, daemon=True) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+def run_ingest_pipeline(docs: Iterable, split_fn: Callable, embed_fn: Callable, store_fn: Callable,
+                        split_workers: int = SPLIT_WORKERS, embed_workers: int = EMBED_WORKERS,
+                        store_workers: int = STORE_WORKERS, queue_size: int = QUEUE_SIZE,
+                        batch_size: int = EMBED_BATCH_SIZE, id_field: str = "source") -> dict:
+    """
+    Streams documents through read -> split -> embed -> store.
+    Each stage runs on its own threads connected by bounded queues, so CPU-bound splitting/embedding
+    overlaps with I/O-bound reading/storing and peak memory is bounded by the queue sizes rather than
+    the corpus size. `docs` may be any iterable, including a generator.
+    `split_fn(doc)` returns the document's chunks as (text, metadata) pairs.
+    Chunk ids are `<metadata[id_field]>_<chunk index>`, or `doc_<content hash>_<chunk index>` for documents
+    without that field.
+    Returns ingest statistics; the first stage error is re-raised after the pipeline shuts down.
+    """
+    started = time.monotonic()
+    stats = {"documents": 0, "chunks": 0, "batches": 0}
+    errors = []
+    stop = threading.Event()
+    lock = threading.Lock()
+    doc_queue = queue.Queue(maxsize=queue_size)
+    chunk_queue = queue.Queue(maxsize=queue_size)
+    embedded_queue = queue.Queue(maxsize=queue_size)
+
+    readers = _start(_read_stage, 1, docs, doc_queue, stats, errors, stop)
+    splitters = _start(_split_stage, split_workers, split_fn, batch_size, id_field, doc_queue, chunk_queue, stats, errors, stop)
+    embedders = _start(_embed_stage, embed_workers, embed_fn, chunk_queue, embedded_queue, stats, errors, stop)
+    storers = _start(_store_stage, store_workers, store_fn, embedded_queue, stats, errors, stop, lock)
+
+    # Shut the stages down in order: once every worker of a stage has exited, end the next stage's input
+    for threads, next_queue, next_count in (
+        (readers, doc_queue, split_workers),
+        (splitters, chunk_queue, embed_workers),
+        (embedders, embedded_queue, store_workers),
+        (storers, None, 0),
+    ):
+        for thread in threads:
+            thread.join()
+        for _ in range(next_count):
+            next_queue.put(_DONE)
+
+    stats["elapsed"] = round(time.monotonic() - started, 3)
+    if errors:
+        raise errors[0]
+    return stats
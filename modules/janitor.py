@@ -0,0 +1,202 @@
+import os
+import stat
+import time
+import shutil
+from modules import session_store
+from modules.rag_pipeline import (
+    client, collection_exists, delete_session_collection, STORAGE_MODE, SHARED_COLLECTION_NAME, FILE_INDEX_SUFFIX,
+)
+from modules.snapshots import export_collection, import_collection
+from graphs.langgraph_workflow import delete_session_checkpoints
+from utils.file_lock import file_lock
+
+# Sessions and clones unused for longer than this are evicted
+SESSION_TTL_SECONDS = float(os.getenv("AIRA_SESSION_TTL", str(30 * 24 * 3600)))
+# Combined size budget for ./vector_store and the repo clones under data/; 0 disables the quota
+DISK_QUOTA_MB = float(os.getenv("AIRA_DISK_QUOTA_MB", "0"))
+# Evicted collections are snapshotted here and restored on the next /start_chat
+ARCHIVE_EVICTED = os.getenv("AIRA_ARCHIVE_EVICTED", "true").lower() == "true"
+ARCHIVE_DIR = os.getenv("AIRA_ARCHIVE_DIR", "data/archive")
+# Seconds between background janitor runs
+JANITOR_INTERVAL = float(os.getenv("AIRA_JANITOR_INTERVAL", "3600"))
+# Fetched documents not used to start a chat within this many seconds are dropped from the document cache
+DOCUMENT_CACHE_TTL = float(os.getenv("AIRA_DOCUMENT_CACHE_TTL", str(24 * 3600)))
+# Held during a run, so only one server worker evicts at a time
+JANITOR_LOCK_PATH = "data/.janitor.lock"
+
+VECTOR_STORE_DIR = "./vector_store"
+CLONES_DIR = "data"
+
+_last_report = None
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass # File vanished mid-walk
+    return total
+
+def _archive_path(session_id: str) -> str:
+    return os.path.join(ARCHIVE_DIR, f"{session_id}.npz")
+
+def _collection_names() -> list:
+    # Older Chroma clients return Collection objects, newer ones return names
+    return [c if isinstance(c, str) else c.name for c in client.list_collections()]
+
+def _clone_dirs() -> list:
+    if not os.path.isdir(CLONES_DIR):
+        return []
+    return [
+        name for name in os.listdir(CLONES_DIR)
+        if os.path.isdir(os.path.join(CLONES_DIR, name, ".git"))
+    ]
+
+def _candidates() -> list:
+    """
+    Returns (kind, name, last_access) for every evictable resource.
+    Resources never seen by the server are tracked from now on (clones from their mtime),
+    so the first janitor run after an upgrade does not wipe everything.
+    """
+    now = time.time()
+    candidates = []
+    collection_access = session_store.get_resource_access("collection")
+    # File indexes are deleted along with their session's collection
+    sessions = {name for name in _collection_names() if not name.endswith(FILE_INDEX_SUFFIX)} - {SHARED_COLLECTION_NAME}
+    if STORAGE_MODE == "shared":
+        sessions |= set(session_store.list_referencing_sessions())
+    for name in sessions:
+        if name not in collection_access:
+            session_store.touch_resource("collection", name, now)
+        candidates.append(("collection", name, collection_access.get(name, now)))
+
+    clone_access = session_store.get_resource_access("clone")
+    for name in _clone_dirs():
+        if name not in clone_access:
+            clone_access[name] = os.path.getmtime(os.path.join(CLONES_DIR, name))
+            session_store.touch_resource("clone", name, clone_access[name])
+        candidates.append(("clone", name, clone_access[name]))
+    return candidates
+
+def _remove_readonly(func, path, _):
+    # Git marks pack files read-only, which rmtree cannot delete on Windows
+    os.chmod(path, stat.S_IWRITE)
+    func(path)
+
+def _evict(kind: str, name: str) -> dict:
+    entry = {"kind": kind, "name": name, "archived": None}
+    if kind == "clone":
+        shutil.rmtree(os.path.join(CLONES_DIR, name), onerror=_remove_readonly)
+    else:
+        # A shared-mode session is archived as its documents in the shared corpus, and re-referenced on restore
+        if ARCHIVE_EVICTED and collection_exists(name):
+            entry["archived"] = export_collection(name, _archive_path(name))["bytes"]
+        delete_session_collection(name)
+        # An evicted session restored from its archive starts new turns, so its checkpoints are not needed
+        delete_session_checkpoints(name)
+    session_store.forget_resource(kind, name)
+    return entry
+
+def _usage() -> int:
+    clones = sum(_dir_size(os.path.join(CLONES_DIR, name)) for name in _clone_dirs())
+    return _dir_size(VECTOR_STORE_DIR) + clones
+
+def run_janitor_once(ttl: float = None, quota_mb: float = None) -> dict:
+    """
+    Evicts session collections and repo clones that have been idle longer than the TTL, then evicts
+    the least recently used ones until disk usage fits the quota. Returns what was evicted and how
+    many bytes were reclaimed.
+    """
+    try:
+        with file_lock(JANITOR_LOCK_PATH, blocking=False):
+            return _run_janitor(ttl, quota_mb)
+    except BlockingIOError:
+        print("Janitor already running in another worker; skipping this run.")
+        return {"skipped": True, "last_run": _last_report}
+
+def _run_janitor(ttl: float, quota_mb: float) -> dict:
+    global _last_report
+    ttl = SESSION_TTL_SECONDS if ttl is None else ttl
+    quota_bytes = (DISK_QUOTA_MB if quota_mb is None else quota_mb) * 1024 * 1024
+    started = time.monotonic()
+    now = time.time()
+    usage_before = _usage()
+
+    evicted, errors = [], []
+    remaining = []
+    # Least recently used first
+    for kind, name, last_access in sorted(_candidates(), key=lambda c: c[2]):
+        if now - last_access > ttl:
+            try:
+                evicted.append({**_evict(kind, name), "reason": "ttl"})
+            except Exception as e:
+                errors.append({"kind": kind, "name": name, "error": str(e)})
+        else:
+            remaining.append((kind, name))
+
+    usage = _usage()
+    if quota_bytes > 0:
+        for kind, name in remaining:
+            if usage <= quota_bytes:
+                break
+            try:
+                evicted.append({**_evict(kind, name), "reason": "quota"})
+            except Exception as e:
+                errors.append({"kind": kind, "name": name, "error": str(e)})
+            usage = _usage()
+
+    pruned_documents = session_store.prune_cached_documents(DOCUMENT_CACHE_TTL)
+    _last_report = {
+        "evicted": evicted,
+        "pruned_documents": pruned_documents,
+        "errors": errors,
+        "usage_before": usage_before,
+        "usage_after": usage,
+        "reclaimed_bytes": max(0, usage_before - usage),
+        "elapsed": round(time.monotonic() - started, 3),
+        "finished_at": time.time(),
+    }
+    if evicted:
+        print(f"Janitor evicted {len(evicted)} item(s), reclaimed {_last_report['reclaimed_bytes']} bytes")
+    return _last_report
+
+def get_janitor_status() -> dict:
+    """Returns the janitor configuration and the report of the last run."""
+    return {
+        "ttl_seconds": SESSION_TTL_SECONDS,
+        "disk_quota_mb": DISK_QUOTA_MB,
+        "archive_evicted": ARCHIVE_EVICTED,
+        "interval_seconds": JANITOR_INTERVAL,
+        "last_run": _last_report,
+    }
+
+def is_archived(session_id: str) -> bool:
+    """Whether an evicted session has an archive waiting to be restored."""
+    return os.path.exists(_archive_path(session_id))
+
+def restore_if_archived(session_id: str) -> bool:
+    """
+    Restores an evicted session from its archive, if one exists: its collection, or in shared storage mode
+    its document references (and any of its documents garbage-collected since). The archive is removed afterwards.
+    """
+    path = _archive_path(session_id)
+    if not os.path.exists(path):
+        return False
+    import_collection(path, session_id)
+    os.remove(path)
+    session_store.touch_resource("collection", session_id)
+    print(f"Restored session '{session_id}' from archive.")
+    return True
+
+def discard_session(session_id: str):
+    """
+    Drops a deleted session's archive, checkpointed turns and access record, so the janitor never restores
+    or tracks it again.
+    """
+    path = _archive_path(session_id)
+    if os.path.exists(path):
+        os.remove(path)
+    delete_session_checkpoints(session_id)
+    session_store.forget_resource("collection", session_id)
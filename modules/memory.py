@@ -1,5 +1,6 @@
 import json
 import os
+from utils.file_lock import file_lock
 
 CHAT_SESSIONS_DIR = "data/chat_sessions"
 
@@ -8,6 +9,9 @@ def _get_session_file_path(session_id: str) -> str:
     os.makedirs(CHAT_SESSIONS_DIR, exist_ok=True)
     return os.path.join(CHAT_SESSIONS_DIR, f"{session_id}.json")
 
+def _get_lock_path(session_id: str) -> str:
+    return _get_session_file_path(session_id) + ".lock"
+
 def load_chat_history(session_id: str) -> list:
     """
     Loads chat history for a given session ID from a JSON file.
@@ -34,7 +38,27 @@ def save_chat_history(session_id: str, history: list):
     """
     file_path = _get_session_file_path(session_id)
     try:
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(history, f, indent=2)
+        with file_lock(_get_lock_path(session_id)):
+            _write_history(file_path, history)
     except Exception as e:
         print(f"Error saving chat history for session {session_id}: {e}")
+
+def _write_history(file_path: str, history: list):
+    # Write to a temporary file and swap it in, so readers never see a half-written history
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2)
+    os.replace(tmp_path, file_path)
+
+def append_chat_messages(session_id: str, messages: list) -> list:
+    """
+    Appends messages to a session's chat history and returns the updated history.
+    The read-modify-write happens under a file lock, so concurrent turns handled by different
+    workers or threads never overwrite each other's messages.
+    """
+    file_path = _get_session_file_path(session_id)
+    with file_lock(_get_lock_path(session_id)):
+        history = load_chat_history(session_id)
+        history.extend(messages)
+        _write_history(file_path, history)
+    return history
@@ -0,0 +1,63 @@
+import re
+from functools import lru_cache
+
+MAX_SUB_QUERIES = 4
+
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "with", "is", "are", "was", "were",
+    "be", "by", "as", "at", "it", "its", "this", "that", "these", "those", "what", "which", "who",
+    "how", "why", "when", "where", "do", "does", "did", "can", "could", "should", "would", "about",
+    "i", "my", "we", "you", "vs", "versus", "me", "tell", "explain", "describe", "please", "between", "from", "into", "there", "their",
+}
+# Conjunctions and punctuation that usually separate the parts of a compound question
+_SPLIT_RE = re.compile(r"\?|;|\n|,\s*(?:and|or)?\s*|\s+(?:and also|and then|as well as|and|versus|vs\.?)\s+", re.IGNORECASE)
+_WORD_RE = re.compile(r"[A-Za-z0-9_.\-]+")
+
+def _keywords(text: str) -> str:
+    return " ".join(w for w in _WORD_RE.findall(text) if w.lower() not in _STOPWORDS)
+
+def heuristic_sub_queries(query: str, max_queries: int = MAX_SUB_QUERIES) -> list:
+    """
+    Expands a question into sub-queries without an LLM call:
+    the original question, each clause of a compound question, and a keyword-only variant.
+    """
+    candidates = [query.strip()]
+    parts = [p.strip() for p in _SPLIT_RE.split(query) if p and len(p.split()) >= 2]
+    if len(parts) > 1:
+        candidates.extend(parts)
+    candidates.append(_keywords(query))
+
+    sub_queries, seen = [], set()
+    for candidate in candidates:
+        key = candidate.lower()
+        if candidate and key not in seen:
+            seen.add(key)
+            sub_queries.append(candidate)
+    return sub_queries[:max_queries]
+
+@lru_cache(maxsize=256)
+def _llm_sub_queries(query: str, max_queries: int) -> tuple:
+    # Imported lazily so the heuristic path does not need the Gemini client
+    from modules.gemini_llm import get_model
+    prompt = f"""Rewrite the following research question into at most {max_queries - 1} short, self-contained search queries that together cover everything it asks. Return one query per line with no numbering.
+
+Question: {query}"""
+    response = get_model("gemini-1.5-flash").generate_content(prompt)
+    lines = [line.strip(" -*\t") for line in response.text.splitlines()]
+    return tuple(line for line in lines if line)
+
+def expand_query(query: str, max_queries: int = MAX_SUB_QUERIES, use_llm: bool = False) -> list:
+    """
+    Returns up to `max_queries` sub-queries for multi-query retrieval, always starting with the original question.
+    With `use_llm`, a (cached) flash call produces the rewrites; the heuristics are the fallback.
+    """
+    if use_llm:
+        try:
+            sub_queries = [query.strip()]
+            for rewrite in _llm_sub_queries(query.strip(), max_queries):
+                if rewrite.lower() not in {q.lower() for q in sub_queries}:
+                    sub_queries.append(rewrite)
+            return sub_queries[:max_queries]
+        except Exception as e:
+            print(f"Query expansion with Gemini failed, using heuristics: {e}")
+    return heuristic_sub_queries(query, max_queries)
@@ -1,63 +1,532 @@
+import os
+import hashlib
+import threading
 import chromadb
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import numpy as np
+from langchain.docstore.document import Document
 from langchain_huggingface import HuggingFaceEmbeddings
+from modules.ingest_pipeline import run_ingest_pipeline
+from modules.chunking import chunk_document, CHUNK_SIZE
+from modules import session_store
+from utils import tracing
 
-# Initialize ChromaDB client
-client = chromadb.PersistentClient(path="./vector_store")
+# Initialize ChromaDB client. An embedded PersistentClient must only be used by one process, so
+# multi-worker deployments point AIRA_CHROMA_HOST at a Chroma server shared by all workers.
+CHROMA_HOST = os.getenv("AIRA_CHROMA_HOST")
+CHROMA_PORT = int(os.getenv("AIRA_CHROMA_PORT", "8000"))
+if CHROMA_HOST:
+    client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+else:
+    client = chromadb.PersistentClient(path="./vector_store")
 
 # Initialize embedding function
 embedding_function = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
 
-def process_and_store_documents(docs: list, collection_name: str):
+# Storage mode. "per_session" keeps one collection per session. "shared" stores each unique document once
+# in a single corpus collection keyed by content hash; sessions hold references to documents and
+# retrieval is restricted to them with a metadata filter.
+STORAGE_MODE = os.getenv("AIRA_STORAGE_MODE", "per_session")
+SHARED_COLLECTION_NAME = "aira_shared_corpus"
+
+# ANN index settings, chosen when a collection is created from the number of chunks it is expected to
+# hold: the first profile whose bound covers the size hint wins (None covers everything, including
+# ingests of unknown size). Small collections can afford a wide search; large ones need a denser graph
+# to keep recall up. Individual keys can be overridden per request, and
+# `python -m modules.index_tuning <collection>` measures recall and latency to recommend settings.
+INDEX_SETTING_KEYS = ("space", "M", "construction_ef", "search_ef")
+INDEX_PROFILES = [
+    (5000, {"space": "cosine", "M": 16, "construction_ef": 100, "search_ef": 100}),
+    (100000, {"space": "cosine", "M": 16, "construction_ef": 200, "search_ef": 64}),
+    (None, {"space": "cosine", "M": 32, "construction_ef": 200, "search_ef": 128}),
+]
+DEFAULT_INDEX_SIZE_HINT = int(os.getenv("AIRA_INDEX_SIZE_HINT", "20000"))
+
+# Relevance grading. Hits whose cosine similarity to the question falls below the collection's
+# calibrated threshold are dropped before generation.
+DEFAULT_RELEVANCE_THRESHOLD = 0.2
+MIN_RELEVANCE_THRESHOLD = 0.1
+MAX_RELEVANCE_THRESHOLD = 0.45
+RELEVANCE_MARGIN = 0.02
+CALIBRATION_SAMPLE_SIZE = 500
+# Off-topic questions used to measure how similar an irrelevant hit can look
+CALIBRATION_PROBES = [
+    "What is the weather forecast for tomorrow?",
+    "Give me a recipe for chocolate chip cookies.",
+    "Who won the football match last night?",
+    "How do I book a cheap flight to Paris?",
+    "What are good exercises for back pain?",
+    "Recommend a movie to watch this weekend.",
+    "How much does a used car cost?",
+    "What time does the grocery store close?",
+]
+_probe_cache = []
+
+# Hierarchical retrieval (opt-in). Ingest also keeps a `<collection>__files` collection of per-file and
+# per-directory centroid vectors. Collections with at least HIERARCHICAL_MIN_CHUNKS chunks are searched
+# in two stages: the top files (within the top directories) are picked first, and only their chunks
+# are searched, with at most HIERARCHICAL_MAX_CHUNKS_PER_FILE hits per file before the rest are used.
+# If the narrowed search finds fewer hits than requested, it falls back to a flat search.
+HIERARCHICAL_INDEX = os.getenv("AIRA_HIERARCHICAL_INDEX", "0") == "1"
+FILE_INDEX_SUFFIX = "__files"
+HIERARCHICAL_MIN_CHUNKS = int(os.getenv("AIRA_HIERARCHICAL_MIN_CHUNKS", "20000"))
+HIERARCHICAL_TOP_FILES = int(os.getenv("AIRA_HIERARCHICAL_TOP_FILES", "20"))
+HIERARCHICAL_TOP_DIRECTORIES = int(os.getenv("AIRA_HIERARCHICAL_TOP_DIRECTORIES", "0")) # 0 skips the directory stage
+HIERARCHICAL_MAX_CHUNKS_PER_FILE = int(os.getenv("AIRA_HIERARCHICAL_MAX_CHUNKS_PER_FILE", "2"))
+HIERARCHICAL_FALLBACK = os.getenv("AIRA_HIERARCHICAL_FALLBACK", "1") == "1"
+HIERARCHICAL_OVERFETCH = 3
+
+# Chunks retrieved per question unless a request asks for a different number
+DEFAULT_N_RESULTS = 5
+# Query embeddings per Chroma call when searching for many questions at once
+QUERY_BATCH_SIZE = 100
+
+def _probe_embeddings() -> list:
+    if not _probe_cache:
+        _probe_cache.extend(embedding_function.embed_documents(CALIBRATION_PROBES))
+    return _probe_cache
+
+def document_hash(content: str) -> str:
+    """Content hash identifying a document in the shared collection."""
+    return hashlib.sha256(content.encode("utf-8", errors="ignore")).hexdigest()
+
+def _unstored_shared_documents(docs, session_id: str, new_hashes: list):
+    """
+    References every document for the session and yields only those not yet in the shared collection,
+    tagged with their content hash.
+    """
+    seen = set()
+    for doc in docs:
+        if not hasattr(doc, 'page_content'):
+            continue
+        doc_hash = document_hash(doc.page_content)
+        already_stored = session_store.reference_document(session_id, doc_hash)
+        if already_stored or doc_hash in seen:
+            continue
+        seen.add(doc_hash)
+        new_hashes.append(doc_hash)
+        yield Document(page_content=doc.page_content, metadata={**doc.metadata, "doc_hash": doc_hash})
+
+def index_settings_for(size_hint: int = None, overrides: dict = None) -> dict:
+    """Returns the index settings profile for a collection of about `size_hint` chunks, with overrides applied."""
+    size_hint = DEFAULT_INDEX_SIZE_HINT if size_hint is None else size_hint
+    settings = next(dict(profile) for bound, profile in INDEX_PROFILES if bound is None or size_hint <= bound)
+    unknown = set(overrides or {}) - set(INDEX_SETTING_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown index settings: {sorted(unknown)}; expected {list(INDEX_SETTING_KEYS)}")
+    settings.update(overrides or {})
+    if settings["space"] not in ("l2", "cosine", "ip"):
+        raise ValueError(f"Unknown distance space '{settings['space']}'")
+    return settings
+
+def index_metadata(settings: dict) -> dict:
+    """Collection metadata that creates an HNSW index with the given settings."""
+    return {f"hnsw:{key}": settings[key] for key in INDEX_SETTING_KEYS if settings.get(key) is not None}
+
+def get_index_settings(collection) -> dict:
+    """Reads a collection's index settings from its configuration (newer Chroma) or its metadata."""
+    metadata = collection.metadata or {}
+    hnsw = (getattr(collection, "configuration", None) or {}).get("hnsw") or {}
+    return {
+        "space": hnsw.get("space") or _collection_space(collection),
+        "M": hnsw.get("max_neighbors") or metadata.get("hnsw:M"),
+        "construction_ef": hnsw.get("ef_construction") or metadata.get("hnsw:construction_ef"),
+        "search_ef": hnsw.get("ef_search") or metadata.get("hnsw:search_ef"),
+    }
+
+def set_search_ef(collection, search_ef: int):
+    """Changes the search breadth of an existing collection; M and construction_ef are fixed once built."""
+    collection.modify(configuration={"hnsw": {"ef_search": int(search_ef)}})
+
+def _estimate_chunks(docs) -> int:
+    """Rough chunk count of a list of documents, for picking index settings; None for streams."""
+    if not isinstance(docs, (list, tuple)):
+        return None
+    return sum(len(getattr(doc, "page_content", "")) // CHUNK_SIZE + 1 for doc in docs)
+
+@tracing.traced("ingest")
+def process_and_store_documents(docs, collection_name: str, size_hint: int = None, index_settings: dict = None) -> dict:
     """
     Processes documents, splits them into chunks, embeds them, and stores them in a session-specific ChromaDB collection.
+    Each document is split by the chunker registered for its file type (see modules.chunking).
+    `docs` may be a list or a generator; documents are streamed through the ingest pipeline, so memory use
+    does not grow with the size of the corpus. Returns the ingest statistics.
+    In shared storage mode, documents already in the shared collection are only referenced, not re-embedded.
+    A new collection gets the index settings profile for `size_hint` chunks (estimated for lists),
+    updated with `index_settings`; an existing collection keeps its settings.
     """
     if not docs:
-        return
-        
-    collection = client.get_or_create_collection(name=collection_name)
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    
-    for doc in docs:
-        # Check if doc is a Document object with page_content
-        if hasattr(doc, 'page_content'):
-            chunks = text_splitter.split_text(doc.page_content)
-            if chunks:
-                # Generate unique IDs for each chunk to avoid collisions
-                source_id = doc.metadata.get("source", "unknown")
-                ids = [f"{source_id}_{i}" for i in range(len(chunks))]
-
-                collection.add(
-                    embeddings=embedding_function.embed_documents(chunks),
-                    documents=chunks,
-                    metadatas=[doc.metadata] * len(chunks),
-                    ids=ids
-                )
-
-def query_vector_db(query: str, collection_name: str, n_results=5) -> list:
+        return {"documents": 0, "chunks": 0, "batches": 0}
+    settings = index_settings_for(_estimate_chunks(docs) if size_hint is None else size_hint, index_settings)
+
+    target_name, id_field, new_hashes = collection_name, "source", []
+    if STORAGE_MODE == "shared":
+        docs = _unstored_shared_documents(docs, collection_name, new_hashes)
+        target_name, id_field = SHARED_COLLECTION_NAME, "doc_hash"
+    collection = None
+    # Running (embedding sum, chunk count) per source file, for the hierarchical file index
+    file_vectors = {} if HIERARCHICAL_INDEX and STORAGE_MODE != "shared" else None
+    file_vectors_lock = threading.Lock()
+
+    def store(**batch):
+        nonlocal collection
+        # Create the collection lazily so an empty stream leaves nothing behind
+        if collection is None:
+            collection = client.get_or_create_collection(name=target_name, metadata=index_metadata(settings))
+        # Upsert so re-processing an updated repository replaces stale chunks
+        with tracing.span("chroma.upsert", collection=target_name, chunks=len(batch["ids"])):
+            collection.upsert(**batch)
+        if file_vectors is not None:
+            with file_vectors_lock:
+                _accumulate_file_vectors(file_vectors, batch["metadatas"], batch["embeddings"])
+
+    def embed(texts):
+        with tracing.span("embed.batch", texts=len(texts), characters=sum(map(len, texts))):
+            return embedding_function.embed_documents(texts)
+
+    stats = run_ingest_pipeline(
+        docs,
+        split_fn=chunk_document,
+        embed_fn=embed,
+        store_fn=store,
+        id_field=id_field,
+    )
+    if STORAGE_MODE == "shared":
+        session_store.mark_documents_stored(new_hashes)
+        stats["referenced_documents"] = len(session_store.get_session_document_hashes(collection_name))
+    if file_vectors:
+        stats["indexed_files"] = _store_file_index(collection_name, file_vectors)
+    tracing.current_span().set(collection=target_name, **stats)
+    print(f"Stored {stats['chunks']} chunks from {stats['documents']} documents in '{target_name}' ({stats['elapsed']}s)")
+    if stats["chunks"]:
+        try:
+            stats["relevance_threshold"] = calibrate_relevance_threshold(target_name)
+        except Exception as e:
+            print(f"Could not calibrate relevance threshold for '{target_name}': {e}")
+    return stats
+
+def file_index_name(collection_name: str) -> str:
+    return f"{collection_name}{FILE_INDEX_SUFFIX}"
+
+def _directory(source: str) -> str:
+    return os.path.dirname(source.replace("\\", "/")) or "."
+
+def _unit(vector: np.ndarray) -> list:
+    return (vector / (np.linalg.norm(vector) + 1e-12)).tolist()
+
+def _accumulate_file_vectors(file_vectors: dict, metadatas: list, embeddings) -> None:
+    for metadata, embedding in zip(metadatas, embeddings):
+        source = (metadata or {}).get("source")
+        if source is None:
+            continue
+        total, count = file_vectors.get(source, (0.0, 0))
+        file_vectors[source] = (total + np.asarray(embedding, dtype=np.float32), count + 1)
+
+def _store_file_index(collection_name: str, file_vectors: dict) -> int:
     """
-    Queries a session-specific vector database for relevant document chunks.
+    Upserts the centroids of the given files into the collection's file index, then recomputes the
+    centroids of their directories from all of the directory's files. Returns the number of files stored.
+    """
+    files = client.get_or_create_collection(name=file_index_name(collection_name), metadata={"hnsw:space": "cosine"})
+    sources = list(file_vectors)
+    with tracing.span("chroma.upsert", collection=files.name, files=len(sources)):
+        for i in range(0, len(sources), 500):
+            batch = sources[i:i + 500]
+            files.upsert(
+                ids=[f"file:{source}" for source in batch],
+                embeddings=[_unit(file_vectors[source][0]) for source in batch],
+                metadatas=[
+                    {"level": "file", "source": source, "directory": _directory(source), "chunks": file_vectors[source][1]}
+                    for source in batch
+                ],
+            )
+        # Directories are rebuilt from every file they hold, including files from earlier ingests
+        directories = sorted({_directory(source) for source in sources})
+        for i in range(0, len(directories), 500):
+            batch = directories[i:i + 500]
+            entries = files.get(
+                where={"$and": [{"level": "file"}, {"directory": {"$in": batch}}]},
+                include=["embeddings", "metadatas"],
+            )
+            totals = {}
+            for embedding, metadata in zip(entries["embeddings"], entries["metadatas"]):
+                total, count = totals.get(metadata["directory"], (0.0, 0))
+                totals[metadata["directory"]] = (total + np.asarray(embedding) * metadata["chunks"], count + metadata["chunks"])
+            files.upsert(
+                ids=[f"dir:{directory}" for directory in totals],
+                embeddings=[_unit(total) for total, _ in totals.values()],
+                metadatas=[{"level": "directory", "directory": directory, "chunks": count} for directory, (_, count) in totals.items()],
+            )
+    file_count = len(files.get(where={"level": "file"}, include=[])["ids"])
+    update_collection_metadata(files, {
+        "aira_files": file_count,
+        "aira_directories": len(files.get(where={"level": "directory"}, include=[])["ids"]),
+    })
+    # Recorded on the chunk collection so queries can decide on two-stage search without extra calls
+    collection = client.get_collection(name=collection_name)
+    update_collection_metadata(collection, {"aira_chunks": collection.count(), "aira_files": file_count})
+    return len(sources)
+
+def build_file_index(collection_name: str, page_size: int = 5000) -> dict:
+    """
+    (Re)builds a collection's hierarchical file index from the chunks already stored, e.g. after a
+    snapshot import or for collections ingested before the index existed.
     """
+    collection = client.get_collection(name=collection_name)
     try:
-        collection = client.get_collection(name=collection_name)
-        query_embedding = embedding_function.embed_query(query)
+        client.delete_collection(name=file_index_name(collection_name))
+    except Exception:
+        pass # No index yet
+    file_vectors = {}
+    offset = 0
+    while True:
+        page = collection.get(limit=page_size, offset=offset, include=["embeddings", "metadatas"])
+        if not page["ids"]:
+            break
+        _accumulate_file_vectors(file_vectors, page["metadatas"], page["embeddings"])
+        offset += len(page["ids"])
+    return {"collection": collection_name, "chunks": offset, "files": _store_file_index(collection_name, file_vectors) if file_vectors else 0}
+
+def _select_files(collection, collection_name: str, query_embeddings: list) -> list:
+    """
+    First stage of hierarchical retrieval: the union of the top files for each query embedding, or None
+    when the collection should be searched flat (too small, no file index, or too few files to narrow).
+    """
+    metadata = collection.metadata or {}
+    if (not HIERARCHICAL_INDEX or metadata.get("aira_chunks", 0) < HIERARCHICAL_MIN_CHUNKS
+            or metadata.get("aira_files", 0) <= HIERARCHICAL_TOP_FILES):
+        return None
+    try:
+        files = client.get_collection(name=file_index_name(collection_name))
+    except Exception:
+        return None
+    metadata = files.metadata or {}
+    with tracing.span("chroma.query", collection=files.name, queries=len(query_embeddings), stage="files") as s:
+        where = {"level": "file"}
+        if HIERARCHICAL_TOP_DIRECTORIES and metadata.get("aira_directories", 0) > HIERARCHICAL_TOP_DIRECTORIES:
+            directories = files.query(query_embeddings=query_embeddings, n_results=HIERARCHICAL_TOP_DIRECTORIES,
+                                      where={"level": "directory"}, include=["metadatas"])
+            names = sorted({m["directory"] for metadatas in directories["metadatas"] for m in metadatas})
+            where = {"$and": [{"level": "file"}, {"directory": {"$in": names}}]}
+        results = files.query(query_embeddings=query_embeddings, n_results=HIERARCHICAL_TOP_FILES,
+                              where=where, include=["metadatas"])
+        sources = sorted({m["source"] for metadatas in results["metadatas"] for m in metadatas})
+        s.set(files=len(sources))
+    return sources or None
+
+def _diversify(hits: list, n_results: int) -> list:
+    """Keeps at most HIERARCHICAL_MAX_CHUNKS_PER_FILE hits per file, filling up with the rest if needed."""
+    picked, overflow, per_file = [], [], {}
+    for hit in hits:
+        source = hit["metadata"].get("source")
+        per_file[source] = per_file.get(source, 0) + 1
+        (picked if per_file[source] <= HIERARCHICAL_MAX_CHUNKS_PER_FILE else overflow).append(hit)
+    return (picked + overflow)[:n_results]
+
+def _resolve_collection(collection_name: str):
+    """
+    Returns (collection, where filter) to search for a session.
+    In shared storage mode a session with document references searches the shared collection,
+    restricted to its own documents; otherwise the session's own collection is used.
+    """
+    if STORAGE_MODE == "shared":
+        doc_hashes = session_store.get_session_document_hashes(collection_name)
+        if doc_hashes:
+            return client.get_collection(name=SHARED_COLLECTION_NAME), {"doc_hash": {"$in": doc_hashes}}
+    return client.get_collection(name=collection_name), None
+
+def _collection_space(collection) -> str:
+    """Returns the distance metric of a collection ("l2", "cosine" or "ip")."""
+    metadata = collection.metadata or {}
+    return metadata.get("hnsw:space") or metadata.get("aira_space") or "l2"
+
+def distances_to_similarity(distances, space: str = "l2") -> np.ndarray:
+    """
+    Converts Chroma distances to cosine similarities (vectorized).
+    all-MiniLM-L6-v2 embeddings are unit length, so squared L2 distance is 2 - 2 * cosine.
+    """
+    distances = np.asarray(distances, dtype=np.float32)
+    if space == "l2":
+        return 1.0 - distances / 2.0
+    # Chroma's cosine and inner-product distances are both 1 - similarity
+    return 1.0 - distances
+
+def update_collection_metadata(collection, updates: dict):
+    """
+    Merges AIRA settings into a collection's metadata.
+    Chroma does not allow HNSW settings to be re-specified on modify, so the distance metric is
+    carried over as `aira_space` and the `hnsw:*` keys are dropped from the update.
+    """
+    metadata = dict(collection.metadata or {})
+    metadata["aira_space"] = _collection_space(collection)
+    metadata = {key: value for key, value in metadata.items() if not key.startswith("hnsw:")}
+    metadata.update(updates)
+    collection.modify(metadata=metadata)
+
+def _scored_hits(results: dict, index: int, space: str) -> list:
+    ids = results.get("ids", [[]])[index]
+    similarities = distances_to_similarity(results.get("distances", [[]])[index], space)
+    return [
+        {"id": chunk_id, "document": doc, "metadata": metadata or {}, "distance": float(distance), "similarity": float(similarity)}
+        for chunk_id, doc, metadata, distance, similarity in zip(
+            ids,
+            results.get("documents", [[]])[index],
+            results.get("metadatas", [[]])[index] or [None] * len(ids),
+            results.get("distances", [[]])[index],
+            similarities,
+        )
+    ]
+
+def _search(collection, collection_name: str, query_embeddings: list, n_results: int, where: dict = None) -> list:
+    """
+    Searches a collection and returns one list of scored hits per query embedding, going through the
+    hierarchical file index when the collection is large enough to have one.
+    """
+    space = _collection_space(collection)
+    files = None if where is not None else _select_files(collection, collection_name, query_embeddings)
+    if files:
+        with tracing.span("chroma.query", collection=collection_name, queries=len(query_embeddings), n_results=n_results,
+                          stage="chunks", files=len(files)):
+            results = collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_results * HIERARCHICAL_OVERFETCH,
+                where={"source": {"$in": files}}
+            )
+        hit_lists = [_diversify(_scored_hits(results, i, space), n_results) for i in range(len(query_embeddings))]
+        if not HIERARCHICAL_FALLBACK or all(len(hits) >= n_results for hits in hit_lists):
+            return hit_lists
+    with tracing.span("chroma.query", collection=collection_name, queries=len(query_embeddings), n_results=n_results, filtered=where is not None):
         results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where
         )
-        # The query returns a list of results for each query embedding. 
-        # Since we only pass one, we take the first element.
-        return results.get("documents", [[]])[0]
+    return [_scored_hits(results, i, space) for i in range(len(results.get("ids", [])))]
+
+def query_vector_db_scored(query: str, collection_name: str, n_results=DEFAULT_N_RESULTS) -> list:
+    """
+    Queries a session-specific vector database and returns the hits with their scores:
+    a list of {"id", "document", "metadata", "distance", "similarity"} dicts, best first.
+    """
+    try:
+        collection, where = _resolve_collection(collection_name)
+        with tracing.span("embed.query", queries=1):
+            query_embedding = embedding_function.embed_query(query)
+        # We only pass one query embedding, so we take the first list of hits.
+        return _search(collection, collection_name, [query_embedding], n_results, where)[0]
     except Exception as e:
         print(f"Error querying collection {collection_name}: {e}")
         return []
 
+def query_vector_db(query: str, collection_name: str, n_results=DEFAULT_N_RESULTS) -> list:
+    """
+    Queries a session-specific vector database for relevant document chunks.
+    """
+    return [hit["document"] for hit in query_vector_db_scored(query, collection_name, n_results)]
+
+def query_vector_db_batch(queries: list, collection_name: str, n_results=DEFAULT_N_RESULTS, batch_size=QUERY_BATCH_SIZE) -> list:
+    """
+    Queries a session-specific vector database with many independent questions at once.
+    All questions are embedded in one batch and searched with multi-vector queries of `batch_size`.
+    Returns one list of scored hits (like query_vector_db_scored) per question, in order.
+    """
+    try:
+        collection, where = _resolve_collection(collection_name)
+        with tracing.span("embed.query", queries=len(queries)):
+            query_embeddings = embedding_function.embed_documents(queries)
+        hit_lists = []
+        for i in range(0, len(query_embeddings), batch_size):
+            hit_lists.extend(_search(collection, collection_name, query_embeddings[i:i + batch_size], n_results, where))
+        return hit_lists
+    except Exception as e:
+        print(f"Error querying collection {collection_name}: {e}")
+        return [[] for _ in queries]
+
+def query_vector_db_multi(queries: list, collection_name: str, n_results=DEFAULT_N_RESULTS, rrf_k=60) -> list:
+    """
+    Queries a session-specific vector database with several sub-queries at once and fuses the results.
+    All sub-queries are embedded in one batch and searched in a single multi-vector query; the ranked
+    lists are merged with reciprocal rank fusion and deduplicated by chunk id.
+    Returns scored hits like query_vector_db_scored, keeping each chunk's best similarity.
+    """
+    try:
+        collection, where = _resolve_collection(collection_name)
+        with tracing.span("embed.query", queries=len(queries)):
+            query_embeddings = embedding_function.embed_documents(queries)
+        fused_scores = {}
+        hits = {}
+        for hit_list in _search(collection, collection_name, query_embeddings, n_results, where):
+            for rank, hit in enumerate(hit_list):
+                chunk_id = hit["id"]
+                fused_scores[chunk_id] = fused_scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+                if chunk_id not in hits or hit["similarity"] > hits[chunk_id]["similarity"]:
+                    hits[chunk_id] = hit
+        ranked = sorted(fused_scores, key=fused_scores.get, reverse=True)
+        return [hits[chunk_id] for chunk_id in ranked[:n_results]]
+    except Exception as e:
+        print(f"Error querying collection {collection_name}: {e}")
+        return []
+
+def calibrate_relevance_threshold(collection_name: str, sample_size: int = CALIBRATION_SAMPLE_SIZE) -> float:
+    """
+    Calibrates the similarity below which a hit is treated as irrelevant, and stores it with the collection.
+    A set of off-topic probe questions is scored against a sample of the collection's chunks; the best
+    similarity an off-topic question reaches is what an irrelevant top hit looks like for this corpus.
+    """
+    collection = client.get_collection(name=collection_name)
+    with tracing.span("chroma.get", collection=collection_name, limit=sample_size):
+        sample = collection.get(limit=sample_size, include=["embeddings"])
+    embeddings = np.asarray(sample.get("embeddings") if sample.get("embeddings") is not None else [], dtype=np.float32)
+    if embeddings.size == 0:
+        return DEFAULT_RELEVANCE_THRESHOLD
+
+    probes = np.asarray(_probe_embeddings(), dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-12
+    probes /= np.linalg.norm(probes, axis=1, keepdims=True) + 1e-12
+    best_probe_similarity = (probes @ embeddings.T).max(axis=1)
+    threshold = float(np.clip(
+        np.percentile(best_probe_similarity, 90) + RELEVANCE_MARGIN,
+        MIN_RELEVANCE_THRESHOLD, MAX_RELEVANCE_THRESHOLD,
+    ))
+    update_collection_metadata(collection, {"aira_relevance_threshold": threshold})
+    print(f"Calibrated relevance threshold for '{collection_name}': {threshold:.3f}")
+    return threshold
+
+def get_relevance_threshold(collection_name: str) -> float:
+    """Returns the calibrated relevance threshold stored with a collection, or the default."""
+    try:
+        collection, _ = _resolve_collection(collection_name)
+        metadata = collection.metadata or {}
+        return float(metadata.get("aira_relevance_threshold", DEFAULT_RELEVANCE_THRESHOLD))
+    except Exception:
+        return DEFAULT_RELEVANCE_THRESHOLD
+
+def _release_shared_documents(session_id: str):
+    """Drops a session's references and garbage-collects shared documents no other session references."""
+    orphaned = session_store.remove_session_references(session_id)
+    if orphaned:
+        # Sessions re-ingesting one of these documents wait in reference_document until the delete is done
+        try:
+            shared = client.get_collection(name=SHARED_COLLECTION_NAME)
+            for i in range(0, len(orphaned), 500):
+                shared.delete(where={"doc_hash": {"$in": orphaned[i:i + 500]}})
+        finally:
+            session_store.finish_collecting(orphaned)
+    print(f"Released session '{session_id}' from the shared collection ({len(orphaned)} documents garbage-collected).")
+
 def delete_session_collection(collection_name: str):
     """
     Deletes a specific ChromaDB collection associated with a session.
+    In shared storage mode, only the session's references are dropped; documents are deleted once unreferenced.
     """
     try:
+        if STORAGE_MODE == "shared" and session_store.get_session_document_hashes(collection_name):
+            _release_shared_documents(collection_name)
+            return
         client.delete_collection(name=collection_name)
+        try:
+            client.delete_collection(name=file_index_name(collection_name))
+        except Exception:
+            pass # Small or older collections have no file index
         print(f"Collection '{collection_name}' deleted successfully.")
     except Exception as e:
         print(f"Error deleting collection '{collection_name}': {e}")
@@ -65,8 +534,11 @@ def delete_session_collection(collection_name: str):
 
 def collection_exists(collection_name: str) -> bool:
     """
-    Checks if a ChromaDB collection with the given name exists.
+    Checks if a ChromaDB collection with the given name exists
+    (or, in shared storage mode, whether the session references any documents).
     """
+    if STORAGE_MODE == "shared" and session_store.get_session_document_hashes(collection_name):
+        return True
     try:
         client.get_collection(name=collection_name)
         return True
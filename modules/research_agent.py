@@ -0,0 +1,92 @@
+import time
+import heapq
+import asyncio
+import numpy as np
+from context_router import stream_context, FETCH_DEADLINE
+from modules.chunking import chunk_document
+from modules.rag_pipeline import embedding_function, DEFAULT_RELEVANCE_THRESHOLD
+from modules.gemini_llm import astream_gemini_response
+from utils import tracing
+
+# One-shot research queries never touch the vector store: chunks are embedded into an in-memory
+# index that only lives for the request.
+TOP_K = 5
+EMBED_BATCH_SIZE = 64
+NO_RELEVANT_DOCUMENTS_RESPONSE = "I couldn't find information relevant to your question in the requested sources."
+
+def _normalize(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / (np.linalg.norm(vectors, axis=-1, keepdims=True) + 1e-12)
+
+def _chunk(docs: list) -> tuple:
+    texts, metadatas = [], []
+    for doc in docs:
+        for chunk, metadata in chunk_document(doc):
+            texts.append(chunk)
+            metadatas.append(metadata)
+    return texts, metadatas
+
+def _embed(texts: list) -> np.ndarray:
+    batches = [
+        embedding_function.embed_documents(texts[i:i + EMBED_BATCH_SIZE])
+        for i in range(0, len(texts), EMBED_BATCH_SIZE)
+    ]
+    return _normalize(np.concatenate([np.asarray(b, dtype=np.float32) for b in batches]))
+
+def _source_top_k(query_vector: np.ndarray, texts: list, metadatas: list, top_k: int) -> list:
+    """Indexes one source's chunks and returns its best (similarity, text, metadata) hits."""
+    with tracing.span("research_agent.index_source", chunks=len(texts)):
+        similarities = _embed(texts) @ query_vector
+    best = np.argsort(-similarities)[:top_k]
+    return [(float(similarities[i]), texts[i], metadatas[i]) for i in best]
+
+async def research_agent_query(query: str, context_sources: list, model_name: str = "gemini-1.5-flash",
+                               top_k: int = TOP_K, deadline: float = FETCH_DEADLINE):
+    """
+    Answers a question in one pass, yielding events for an NDJSON stream:
+      {"event": "source", ...} as each source is fetched, chunked, embedded and searched,
+      {"event": "context", "hits": [...]} with the merged top-k chunks,
+      {"event": "answer", "text": ...} fragments as Gemini streams its answer, and
+      {"event": "done", "timings": {...}} at the end.
+    The question is embedded while the sources are still being fetched, and each source is searched
+    as soon as it arrives, so only the generation waits for the slowest source.
+    """
+    started = time.monotonic()
+    timings = {}
+    # Embed the question concurrently with the source fetches
+    query_task = asyncio.ensure_future(asyncio.to_thread(embedding_function.embed_query, query))
+    best_hits = [] # Min-heap of the top-k (similarity, order, text, metadata) across sources
+    order = 0
+
+    async for source_name, docs, report in stream_context(query, context_sources, deadline):
+        texts, metadatas = await asyncio.to_thread(_chunk, docs)
+        hits = []
+        if texts:
+            query_vector = _normalize(await query_task)
+            hits = await asyncio.to_thread(_source_top_k, query_vector, texts, metadatas, top_k)
+        # Per-source top-k lists merge into the global top-k, since every score is against the same question
+        for similarity, text, metadata in hits:
+            order += 1
+            heapq.heappush(best_hits, (similarity, order, text, metadata))
+            if len(best_hits) > top_k:
+                heapq.heappop(best_hits)
+        timings.setdefault("first_source_indexed", round(time.monotonic() - started, 3))
+        yield {"event": "source", "source": source_name, "report": report, "chunks": len(texts)}
+
+    if not query_task.done():
+        query_task.cancel() # No source returned anything to search
+    timings["retrieval"] = round(time.monotonic() - started, 3)
+    ranked = sorted(best_hits, reverse=True)
+    relevant = [(similarity, text, metadata) for similarity, _, text, metadata in ranked if similarity >= DEFAULT_RELEVANCE_THRESHOLD]
+    yield {"event": "context", "hits": [
+        {"similarity": round(similarity, 4), "document": text, "metadata": metadata} for similarity, text, metadata in relevant
+    ]}
+
+    if not relevant:
+        yield {"event": "answer", "text": NO_RELEVANT_DOCUMENTS_RESPONSE}
+    else:
+        async for fragment in astream_gemini_response(query, [text for _, text, _ in relevant], model_name=model_name):
+            timings.setdefault("first_token", round(time.monotonic() - started, 3))
+            yield {"event": "answer", "text": fragment}
+    timings["total"] = round(time.monotonic() - started, 3)
+    yield {"event": "done", "timings": timings}
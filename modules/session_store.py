@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import List, Tuple
+
+# Local database for session bookkeeping that must survive restarts and be shared by server workers
+STATE_DB_PATH = os.getenv("AIRA_STATE_DB", "data/aira_state.sqlite")
+# Seconds a reference waits for its document's garbage collection to finish; older marks are from a crashed worker
+COLLECTION_WAIT_SECONDS = 120
+
+_db_lock = threading.Lock()
+_schema_ready = False
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(STATE_DB_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(STATE_DB_PATH, timeout=30)
+    # WAL lets worker processes read while another one writes
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+def _create_schema(conn: sqlite3.Connection):
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS shared_documents (
+            doc_hash TEXT PRIMARY KEY,
+            stored_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS session_documents (
+            session_id TEXT NOT NULL,
+            doc_hash TEXT NOT NULL,
+            PRIMARY KEY (session_id, doc_hash)
+        );
+        CREATE INDEX IF NOT EXISTS idx_session_documents_hash ON session_documents(doc_hash);
+        CREATE TABLE IF NOT EXISTS collecting_documents (
+            doc_hash TEXT PRIMARY KEY,
+            started_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS resource_access (
+            kind TEXT NOT NULL,
+            name TEXT NOT NULL,
+            last_access REAL NOT NULL,
+            PRIMARY KEY (kind, name)
+        );
+        CREATE TABLE IF NOT EXISTS fetched_documents (
+            doc_id TEXT PRIMARY KEY,
+            content TEXT NOT NULL,
+            metadata TEXT NOT NULL,
+            fetched_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_fetched_documents_time ON fetched_documents(fetched_at);
+    """)
+
+def _execute(fn):
+    global _schema_ready
+    with _db_lock:
+        conn = _connect()
+        try:
+            # The schema is created once per process, not on every call from a request path
+            if not _schema_ready:
+                _create_schema(conn)
+                _schema_ready = True
+            result = fn(conn)
+            conn.commit()
+            return result
+        finally:
+            conn.close()
+
+# --- Shared corpus documents and session references ---
+
+def reference_document(session_id: str, doc_hash: str) -> bool:
+    """
+    Adds a session's reference to a document and returns whether the document is already stored
+    in the shared collection. The reference is taken first, so a concurrent session delete can
+    never garbage-collect a document this session is about to rely on. If the document is being
+    garbage-collected right now, this waits for the delete to finish and reports it as not stored,
+    so its chunks are written again after the delete instead of being removed by it.
+    """
+    def reference(conn):
+        conn.execute(
+            "INSERT OR IGNORE INTO session_documents (session_id, doc_hash) VALUES (?, ?)", (session_id, doc_hash)
+        )
+        return _stored_or_collecting(conn, doc_hash)
+
+    def check(conn):
+        return _stored_or_collecting(conn, doc_hash)
+
+    stored, collecting = _execute(reference)
+    deadline = time.time() + COLLECTION_WAIT_SECONDS
+    while collecting and time.time() < deadline:
+        time.sleep(0.1)
+        stored, collecting = _execute(check)
+    return stored
+
+def _stored_or_collecting(conn, doc_hash: str) -> Tuple[bool, bool]:
+    stored = conn.execute("SELECT 1 FROM shared_documents WHERE doc_hash = ?", (doc_hash,)).fetchone() is not None
+    collecting = conn.execute(
+        "SELECT 1 FROM collecting_documents WHERE doc_hash = ? AND started_at > ?",
+        (doc_hash, time.time() - COLLECTION_WAIT_SECONDS),
+    ).fetchone() is not None
+    return stored, collecting
+
+def mark_documents_stored(doc_hashes: List[str]):
+    """Records documents as fully stored in the shared collection."""
+    now = time.time()
+    _execute(lambda conn: conn.executemany(
+        "INSERT OR REPLACE INTO shared_documents (doc_hash, stored_at) VALUES (?, ?)",
+        [(doc_hash, now) for doc_hash in doc_hashes],
+    ))
+
+def get_session_document_hashes(session_id: str) -> List[str]:
+    return _execute(lambda conn: [
+        row[0] for row in conn.execute("SELECT doc_hash FROM session_documents WHERE session_id = ?", (session_id,))
+    ])
+
+def remove_session_references(session_id: str) -> List[str]:
+    """
+    Drops a session's document references and returns the hashes of documents that are no longer
+    referenced by any session. Those are forgotten here and marked as being collected; the caller must
+    delete them from the shared collection and then call finish_collecting, which lets sessions
+    waiting in reference_document store them again.
+    """
+    def remove(conn):
+        doc_hashes = [row[0] for row in conn.execute(
+            "SELECT doc_hash FROM session_documents WHERE session_id = ?", (session_id,)
+        )]
+        conn.execute("DELETE FROM session_documents WHERE session_id = ?", (session_id,))
+        orphaned = [
+            doc_hash for doc_hash in doc_hashes
+            if conn.execute("SELECT 1 FROM session_documents WHERE doc_hash = ? LIMIT 1", (doc_hash,)).fetchone() is None
+        ]
+        conn.executemany("DELETE FROM shared_documents WHERE doc_hash = ?", [(h,) for h in orphaned])
+        now = time.time()
+        conn.executemany(
+            "INSERT OR REPLACE INTO collecting_documents (doc_hash, started_at) VALUES (?, ?)", [(h, now) for h in orphaned]
+        )
+        return orphaned
+    return _execute(remove)
+
+def finish_collecting(doc_hashes: List[str]):
+    """Clears the garbage-collection marks set by remove_session_references once the delete is done."""
+    _execute(lambda conn: conn.executemany(
+        "DELETE FROM collecting_documents WHERE doc_hash = ?", [(h,) for h in doc_hashes]
+    ))
+
+def list_referencing_sessions() -> List[str]:
+    """Returns the ids of sessions that reference documents in the shared collection."""
+    return _execute(lambda conn: [row[0] for row in conn.execute("SELECT DISTINCT session_id FROM session_documents")])
+
+# --- Last-access tracking for eviction ---
+
+def touch_resource(kind: str, name: str, when: float = None):
+    """Records that a resource ("collection" or "clone") was just used."""
+    _execute(lambda conn: conn.execute(
+        "INSERT OR REPLACE INTO resource_access (kind, name, last_access) VALUES (?, ?, ?)",
+        (kind, name, when or time.time()),
+    ))
+
+def get_resource_access(kind: str) -> dict:
+    """Returns {name: last_access} for every tracked resource of a kind."""
+    return _execute(lambda conn: dict(conn.execute(
+        "SELECT name, last_access FROM resource_access WHERE kind = ?", (kind,)
+    ).fetchall()))
+
+def forget_resource(kind: str, name: str):
+    _execute(lambda conn: conn.execute("DELETE FROM resource_access WHERE kind = ? AND name = ?", (kind, name)))
+
+# --- Fetched documents awaiting /start_chat ---
+
+def cache_documents(documents: List[Tuple[str, str, dict]]):
+    """Stores fetched documents as (doc_id, content, metadata) so any server worker can start a chat with them."""
+    now = time.time()
+    _execute(lambda conn: conn.executemany(
+        "INSERT OR REPLACE INTO fetched_documents (doc_id, content, metadata, fetched_at) VALUES (?, ?, ?, ?)",
+        [(doc_id, content, json.dumps(metadata, default=str), now) for doc_id, content, metadata in documents],
+    ))
+
+def get_cached_documents(doc_ids: List[str]) -> List[Tuple[str, str, dict]]:
+    """Returns (doc_id, content, metadata) for the ids that are cached, in the order requested."""
+    def load(conn):
+        rows = {}
+        for doc_id in doc_ids:
+            row = conn.execute("SELECT content, metadata FROM fetched_documents WHERE doc_id = ?", (doc_id,)).fetchone()
+            if row is not None:
+                rows[doc_id] = (doc_id, row[0], json.loads(row[1]))
+        return [rows[doc_id] for doc_id in doc_ids if doc_id in rows]
+    return _execute(load)
+
+def prune_cached_documents(max_age: float) -> int:
+    """Drops fetched documents older than `max_age` seconds and returns how many were removed."""
+    cutoff = time.time() - max_age
+    return _execute(lambda conn: conn.execute("DELETE FROM fetched_documents WHERE fetched_at < ?", (cutoff,)).rowcount)
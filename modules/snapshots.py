@@ -0,0 +1,148 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+from modules import session_store
+from modules.rag_pipeline import (
+    client, _resolve_collection, build_file_index, HIERARCHICAL_INDEX, get_index_settings, index_metadata,
+    STORAGE_MODE, SHARED_COLLECTION_NAME,
+)
+
+# Version 2 stores embeddings as float16; version 1 snapshots (float32) still load
+SNAPSHOT_FORMAT_VERSION = 2
+# Rows read from Chroma per call on export
+SNAPSHOT_PAGE_SIZE = 5000
+USAGE = "Usage: python -m modules.snapshots export <session_id> <file.npz> | import <file.npz> [session_id]"
+
+def _max_batch_size() -> int:
+    """The largest add() the vector store accepts, so imports need as few calls as possible."""
+    try:
+        return client.get_max_batch_size()
+    except Exception:
+        return SNAPSHOT_PAGE_SIZE
+
+def export_collection(collection_name: str, path: str) -> dict:
+    """
+    Writes a session's ids, documents, metadata and embeddings to a single compressed `.npz` file.
+    Embeddings are stored as float16, which halves their size with no measurable effect on retrieval;
+    documents and metadata are stored as compressed JSON.
+    Returns a summary with the row count, file size and elapsed time.
+    """
+    started = time.monotonic()
+    # In shared storage mode this exports only the session's own documents from the shared collection
+    collection, where = _resolve_collection(collection_name)
+    ids, documents, metadatas, embeddings = [], [], [], []
+    offset = 0
+    while True:
+        page = collection.get(
+            where=where, limit=SNAPSHOT_PAGE_SIZE, offset=offset, include=["documents", "metadatas", "embeddings"]
+        )
+        if not page["ids"]:
+            break
+        ids.extend(page["ids"])
+        documents.extend(page["documents"])
+        metadatas.extend(page["metadatas"])
+        embeddings.append(np.asarray(page["embeddings"], dtype=np.float16))
+        offset += len(page["ids"])
+
+    header = {
+        "version": SNAPSHOT_FORMAT_VERSION,
+        "collection_name": collection_name,
+        "collection_metadata": collection.metadata or {},
+        "index_settings": get_index_settings(collection),
+        "count": len(ids),
+        # Rows of a shared-mode session come from the shared collection and are re-referenced on import
+        "shared": where is not None,
+    }
+    records = {"ids": ids, "documents": documents, "metadatas": metadatas}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        np.savez_compressed(
+            f,
+            header=np.frombuffer(json.dumps(header).encode("utf-8"), dtype=np.uint8),
+            records=np.frombuffer(json.dumps(records).encode("utf-8"), dtype=np.uint8),
+            embeddings=np.concatenate(embeddings) if embeddings else np.zeros((0, 0), dtype=np.float16),
+        )
+    return {"collection": collection_name, "count": len(ids), "bytes": os.path.getsize(path),
+            "elapsed": round(time.monotonic() - started, 3)}
+
+def import_collection(path: str, collection_name: str = None, index_settings: dict = None) -> dict:
+    """
+    Loads a snapshot written by export_collection into the vector store, without re-embedding anything.
+    The collection is created (or replaced) under `collection_name`, defaulting to the exported name,
+    and rows are added in the largest batches the vector store accepts. The index is built with the
+    exported index settings, updated with `index_settings`. The hierarchical file index is rebuilt from
+    the imported embeddings. A shared-mode session's snapshot imported in shared mode is restored as
+    references into the shared collection instead (see _import_shared).
+    """
+    started = time.monotonic()
+    with np.load(path) as snapshot:
+        header = json.loads(snapshot["header"].tobytes().decode("utf-8"))
+        records = json.loads(snapshot["records"].tobytes().decode("utf-8"))
+        embeddings = snapshot["embeddings"].astype(np.float32)
+
+    collection_name = collection_name or header["collection_name"]
+    if header.get("shared") and STORAGE_MODE == "shared":
+        stats = _import_shared(collection_name, header, records, embeddings, index_settings)
+        stats["elapsed"] = round(time.monotonic() - started, 3)
+        return stats
+    try:
+        client.delete_collection(name=collection_name)
+    except Exception:
+        pass # Nothing to replace
+    metadata = dict(header["collection_metadata"] or {})
+    # Snapshots written before index settings were exported only carry the distance metric
+    settings = header.get("index_settings") or {"space": metadata.get("hnsw:space") or metadata.get("aira_space")}
+    metadata.update(index_metadata({**settings, **(index_settings or {})}))
+    collection = client.create_collection(name=collection_name, metadata=metadata or None)
+
+    batch_size = _max_batch_size()
+    ids = records["ids"]
+    for i in range(0, len(ids), batch_size):
+        collection.add(
+            ids=ids[i:i + batch_size],
+            documents=records["documents"][i:i + batch_size],
+            metadatas=records["metadatas"][i:i + batch_size],
+            embeddings=embeddings[i:i + batch_size],
+        )
+    if HIERARCHICAL_INDEX and ids:
+        build_file_index(collection_name)
+    return {"collection": collection_name, "count": len(ids), "elapsed": round(time.monotonic() - started, 3)}
+
+def _import_shared(collection_name: str, header: dict, records: dict, embeddings: np.ndarray,
+                   index_settings: dict = None) -> dict:
+    """
+    Restores a shared-mode session: the session references each of its documents again, and only the
+    chunks of documents no longer in the shared collection are added back to it.
+    """
+    rows = {}
+    for i, metadata in enumerate(records["metadatas"]):
+        rows.setdefault((metadata or {}).get("doc_hash"), []).append(i)
+    rows.pop(None, None)
+    missing = [doc_hash for doc_hash in rows if not session_store.reference_document(collection_name, doc_hash)]
+    indices = [i for doc_hash in missing for i in rows[doc_hash]]
+    if indices:
+        settings = {**(header.get("index_settings") or {}), **(index_settings or {})}
+        collection = client.get_or_create_collection(name=SHARED_COLLECTION_NAME, metadata=index_metadata(settings))
+        batch_size = _max_batch_size()
+        for i in range(0, len(indices), batch_size):
+            batch = indices[i:i + batch_size]
+            collection.upsert(
+                ids=[records["ids"][j] for j in batch],
+                documents=[records["documents"][j] for j in batch],
+                metadatas=[records["metadatas"][j] for j in batch],
+                embeddings=embeddings[batch],
+            )
+    session_store.mark_documents_stored(missing)
+    return {"collection": collection_name, "count": len(records["ids"]), "documents": len(rows),
+            "restored_documents": len(missing)}
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("export", "import") or (sys.argv[1] == "export" and len(sys.argv) < 4):
+        print(USAGE)
+        sys.exit(1)
+    if sys.argv[1] == "export":
+        print(json.dumps(export_collection(sys.argv[2], sys.argv[3])))
+    else:
+        print(json.dumps(import_collection(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)))
@@ -0,0 +1,58 @@
+"""
+Eviction and restore of a session in shared storage mode.
+
+Storage settings are read when the modules are imported and the vector store lives in the working
+directory, so the scenario runs in a fresh interpreter inside a temporary directory.
+"""
+import os
+import sys
+import json
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIO = """
+import json
+import time
+from langchain_core.documents import Document
+from modules import janitor, session_store
+from modules.rag_pipeline import process_and_store_documents, collection_exists, query_vector_db, client, SHARED_COLLECTION_NAME
+
+docs = [Document(page_content=f"Document {i} about vector search and HNSW graphs. " * 40, metadata={"source": f"doc{i}.txt"})
+        for i in range(3)]
+process_and_store_documents(docs, "session_a")
+shared = client.get_collection(SHARED_COLLECTION_NAME)
+before = shared.count()
+
+# Last used a minute ago, so a zero TTL evicts it
+session_store.touch_resource("collection", "session_a", time.time() - 60)
+report = janitor.run_janitor_once(ttl=0)
+evicted = {"archived": report["evicted"][0]["archived"], "exists": collection_exists("session_a"),
+           "count": shared.count(), "archive": os.path.exists(janitor._archive_path("session_a"))}
+
+restored = janitor.restore_if_archived("session_a")
+print(json.dumps({
+    "before": before, "evicted": evicted, "restored": restored, "exists": collection_exists("session_a"),
+    "count": client.get_collection(SHARED_COLLECTION_NAME).count(),
+    "hits": len(query_vector_db("HNSW graphs", "session_a")),
+}))
+"""
+
+def test_shared_session_is_archived_on_eviction_and_restored(tmp_path):
+    env = {**os.environ, "AIRA_STORAGE_MODE": "shared", "AIRA_ARCHIVE_EVICTED": "true",
+           "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY", "test")}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")]))
+    result = subprocess.run([sys.executable, "-c", "import os\n" + SCENARIO], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=600)
+    assert result.returncode == 0, result.stderr
+    outcome = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert outcome["before"] > 0
+    assert outcome["evicted"]["archived"]
+    assert outcome["evicted"]["archive"]
+    assert not outcome["evicted"]["exists"]
+    assert outcome["evicted"]["count"] == 0
+    assert outcome["restored"]
+    assert outcome["exists"]
+    assert outcome["count"] == outcome["before"]
+    assert outcome["hits"] > 0
@@ -7,6 +7,73 @@ import os
 st.title("AIRA - AI-Powered Research Assistant")
 
 CHAT_SESSIONS_FILE = "chat_sessions.json"
+BACKEND_URL = os.getenv("AIRA_BACKEND_URL", "http://127.0.0.1:5000")
+# (connect, read) timeouts in seconds; repository ingestion gets a longer read timeout
+REQUEST_TIMEOUT = (5, 180)
+INGEST_TIMEOUT = (5, 1800)
+# Only this many chat messages / fetched documents are rendered per page
+MESSAGES_PAGE_SIZE = 50
+DOCS_PAGE_SIZE = 20
+
+# Reruns only the decorated block on interaction inside it (no-op on Streamlit versions without fragments)
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda fn: fn)
+
+@st.cache_resource
+def get_backend_session() -> requests.Session:
+    """One pooled HTTP session per Streamlit server, so backend calls reuse connections across reruns."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def backend_post(endpoint: str, payload: dict, timeout=REQUEST_TIMEOUT) -> requests.Response:
+    return get_backend_session().post(f"{BACKEND_URL}{endpoint}", json=payload, timeout=timeout)
+
+@st.cache_data(max_entries=5000, show_spinner=False)
+def parse_message_segments(content: str) -> list:
+    """
+    Splits a message into ("markdown", text, None) and ("code", text, language) segments at code fences.
+    Cached, so each message is parsed once rather than on every rerun.
+    """
+    segments = []
+    text_lines = []
+    code_lines = None
+    code_language = None
+    for line in content.split('\n'):
+        if line.strip().startswith("```"):
+            if code_lines is not None:
+                # End of code block
+                segments.append(("code", "\n".join(code_lines), code_language))
+                code_lines = None
+            else:
+                # Start of code block; extract language if specified (e.g., ```python)
+                if text_lines:
+                    segments.append(("markdown", "\n".join(text_lines), None))
+                    text_lines = []
+                code_lines = []
+                code_language = line.strip()[3:].strip() or "plaintext"
+        elif code_lines is not None:
+            code_lines.append(line)
+        else:
+            text_lines.append(line)
+    # A code block may be left open at the end of the message
+    if code_lines:
+        segments.append(("code", "\n".join(code_lines), code_language))
+    if text_lines:
+        segments.append(("markdown", "\n".join(text_lines), None))
+    return segments
+
+def render_message(message: dict):
+    with st.chat_message(message["role"]):
+        if message["role"] != "assistant":
+            st.markdown(message["content"])
+            return
+        for kind, text, language in parse_message_segments(message["content"]):
+            if kind == "code":
+                st.code(text, language=language)
+            elif text.strip():
+                st.markdown(text)
 
 def load_chat_sessions():
     if os.path.exists(CHAT_SESSIONS_FILE):
@@ -26,6 +93,8 @@ if "session_id" not in st.session_state:
     st.session_state.selected_docs = []
     st.session_state.past_chats = load_chat_sessions() # Load existing sessions
     st.session_state.app_stage = "fetching"
+    st.session_state.selected_doc_ids = set()
+    st.session_state.history_pages = 1
     if "selected_model" not in st.session_state:
         st.session_state.selected_model = "gemini-1.5-pro" # Default value
 
@@ -37,6 +106,8 @@ with st.sidebar:
         st.session_state.messages = []
         st.session_state.fetched_docs = []
         st.session_state.selected_docs = []
+        st.session_state.selected_doc_ids = set()
+        st.session_state.history_pages = 1
         st.session_state.app_stage = "fetching"
         st.rerun()
 
@@ -50,15 +121,15 @@ with st.sidebar:
                 if st.button(f"Chat on: {chat_data['topic']}", key=f"load_{chat_id}"):
                     st.session_state.session_id = chat_id
                     st.session_state.messages = chat_data["messages"]
+                    st.session_state.history_pages = 1
                     st.session_state.app_stage = "chatting"
                     st.rerun()
             with col2:
                 if st.button("Delete", key=f"delete_{chat_id}"):
                     # Call the backend to delete the session data
                     try:
-                        delete_url = "http://127.0.0.1:5000/delete_session"
                         payload = {"session_id": chat_id}
-                        response = requests.post(delete_url, json=payload)
+                        response = backend_post("/delete_session", payload)
                         response.raise_for_status()
                         st.toast(f"Session '{st.session_state.past_chats[chat_id]['topic']}' deleted successfully.")
                     except requests.exceptions.RequestException as e:
@@ -74,6 +145,7 @@ with st.sidebar:
                         st.session_state.messages = []
                         st.session_state.fetched_docs = []
                         st.session_state.selected_docs = []
+                        st.session_state.selected_doc_ids = set()
                         st.session_state.app_stage = "fetching"
                     st.rerun()
 
@@ -85,6 +157,48 @@ with st.sidebar:
 )
 
 
+def toggle_document(doc_id: str):
+    if st.session_state[f"select_{doc_id}"]:
+        st.session_state.selected_doc_ids.add(doc_id)
+    else:
+        st.session_state.selected_doc_ids.discard(doc_id)
+
+@fragment
+def render_document_selection():
+    """Renders one page of fetched documents; ticking a checkbox only reruns this block."""
+    docs = st.session_state.fetched_docs
+    pages = max(1, -(-len(docs) // DOCS_PAGE_SIZE))
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"Page (of {pages}, {len(docs)} documents)", min_value=1, max_value=pages, value=1, step=1)
+    st.caption(f"{len(st.session_state.selected_doc_ids)} document(s) selected")
+    for doc in docs[(page - 1) * DOCS_PAGE_SIZE:page * DOCS_PAGE_SIZE]:
+        metadata = doc.get('metadata', {})
+        source_type = metadata.get('source_type')
+        
+        # Use filename for local files, otherwise use title
+        if source_type == 'user_local_files':
+            title = metadata.get('source', 'Unknown Local File')
+        else:
+            title = doc.get('title', metadata.get('source', 'Unknown Document'))
+        
+        st.subheader(title)
+
+        # Only show content preview if it's not a local file
+        if source_type != 'user_local_files':
+            content_preview = doc.get('content', 'No content preview available.')
+            if len(content_preview) > 500:
+                content_preview = content_preview[:500] + "..."
+            st.markdown(content_preview)
+
+        # Add a checkbox for selection
+        st.checkbox(
+            f"Select this document", key=f"select_{doc['id']}",
+            value=doc['id'] in st.session_state.selected_doc_ids,
+            on_change=toggle_document, args=(doc['id'],),
+        )
+        st.markdown("---") # Add a separator for clarity
+
 # --- Main App Logic ---
 
 # Stage 1: Fetching Sources
@@ -108,12 +222,12 @@ if st.session_state.app_stage == "fetching":
 
     if st.button("Fetch Sources"):
         with st.spinner("Fetching documents..."):
-            api_url = "http://127.0.0.1:5000/fetch_sources"
             payload = {"query": query, "context_sources": selected_sources}
             try:
-                response = requests.post(api_url, json=payload)
+                response = backend_post("/fetch_sources", payload)
                 response.raise_for_status()
                 st.session_state.fetched_docs = response.json().get("documents", [])
+                st.session_state.selected_doc_ids = set()
                 if not st.session_state.fetched_docs:
                     st.warning("No documents found. Please try a different query or check your data folder.")
             except requests.exceptions.RequestException as e:
@@ -121,32 +235,11 @@ if st.session_state.app_stage == "fetching":
 
     if st.session_state.fetched_docs:
         st.header("2. Select Documents to Analyze")
-        selected_ids = []
-        for doc in st.session_state.fetched_docs:
-            metadata = doc.get('metadata', {})
-            source_type = metadata.get('source_type')
-            
-            # Use filename for local files, otherwise use title
-            if source_type == 'user_local_files':
-                title = metadata.get('source', 'Unknown Local File')
-            else:
-                title = doc.get('title', metadata.get('source', 'Unknown Document'))
-            
-            st.subheader(title)
-
-            # Only show content preview if it's not a local file
-            if source_type != 'user_local_files':
-                content_preview = doc.get('content', 'No content preview available.')
-                if len(content_preview) > 500:
-                    content_preview = content_preview[:500] + "..."
-                st.markdown(content_preview)
-
-            # Add a checkbox for selection
-            if st.checkbox(f"Select this document", key=doc['id']):
-                selected_ids.append(doc['id'])
-            st.markdown("---") # Add a separator for clarity
-        
-        st.session_state.selected_docs = selected_ids
+        render_document_selection()
+        # Selections are kept by id, so documents on other pages stay selected
+        st.session_state.selected_docs = [
+            doc['id'] for doc in st.session_state.fetched_docs if doc['id'] in st.session_state.selected_doc_ids
+        ]
 
         if st.button("Start Chat with Selected Documents"):
             if not st.session_state.selected_docs:
@@ -176,20 +269,18 @@ if st.session_state.app_stage == "fetching":
                     repo_name_for_collection = full_name.replace("/", "-").replace(".", "_") # Sanitize for collection name
 
                     with st.spinner(f"Cloning and processing the full GitHub repository '{full_name}'. This may take a moment..."):
-                        process_api_url = "http://127.0.0.1:5000/process_github_repo"
                         process_payload = {"repo_url": repo_url, "repo_name": repo_name_for_collection}
                         try:
-                            process_response = requests.post(process_api_url, json=process_payload)
+                            process_response = backend_post("/process_github_repo", process_payload, timeout=INGEST_TIMEOUT)
                             process_response.raise_for_status()
                             st.success(f"Repository '{full_name}' processed successfully!")
 
                             # Generate title and summary for the repo
                             with st.spinner("Generating title and summary for the repository..."):
-                                title_api_url = "http://127.0.0.1:5000/generate_title_and_summary"
                                 # We pass the initial README doc ID to get some context
                                 title_payload = {"document_ids": [selected_github_repo_info['id']]}
                                 try:
-                                    title_response = requests.post(title_api_url, json=title_payload)
+                                    title_response = backend_post("/generate_title_and_summary", title_payload)
                                     title_response.raise_for_status()
                                     chat_meta = title_response.json()
                                     topic = chat_meta.get("title", f"Chat about {full_name}")
@@ -200,18 +291,20 @@ if st.session_state.app_stage == "fetching":
                                     summary = "Could not generate summary for the repository."
 
                             # Now start the chat session
-                            start_chat_api_url = "http://127.0.0.1:5000/start_chat"
                             start_chat_payload = {"session_id": repo_name_for_collection, "document_ids": []}
-                            start_chat_response = requests.post(start_chat_api_url, json=start_chat_payload)
+                            start_chat_response = backend_post("/start_chat", start_chat_payload)
                             start_chat_response.raise_for_status()
 
                             st.session_state.app_stage = "chatting"
                             st.session_state.session_id = repo_name_for_collection
+                            st.session_state.messages = start_chat_response.json().get("chat_history", [])
+                            st.session_state.history_pages = 1
                             st.session_state.past_chats[st.session_state.session_id] = {
                                 "topic": topic,
                                 "summary": summary,
-                                "messages": start_chat_response.json().get("chat_history", [])
+                                "messages": st.session_state.messages
                             }
+                            save_chat_sessions(st.session_state.past_chats)
                             st.rerun()
 
                         except requests.exceptions.RequestException as e:
@@ -219,10 +312,9 @@ if st.session_state.app_stage == "fetching":
                 else:
                     # Proceed with existing logic for non-GitHub documents
                     with st.spinner("Generating title and summary..."):
-                        title_api_url = "http://127.0.0.1:5000/generate_title_and_summary"
                         title_payload = {"document_ids": st.session_state.selected_docs}
                         try:
-                            title_response = requests.post(title_api_url, json=title_payload)
+                            title_response = backend_post("/generate_title_and_summary", title_payload)
                             title_response.raise_for_status()
                             chat_meta = title_response.json()
                             topic = chat_meta.get("title", "Chat about selected documents")
@@ -233,17 +325,19 @@ if st.session_state.app_stage == "fetching":
                             summary = "Could not generate summary."
 
                     with st.spinner("Processing documents and starting chat..."):
-                        api_url = "http://127.0.0.1:5000/start_chat"
                         payload = {"session_id": st.session_state.session_id, "document_ids": st.session_state.selected_docs}
                         try:
-                            response = requests.post(api_url, json=payload)
+                            response = backend_post("/start_chat", payload, timeout=INGEST_TIMEOUT)
                             response.raise_for_status()
                             st.session_state.app_stage = "chatting"
+                            st.session_state.messages = response.json().get("chat_history", [])
+                            st.session_state.history_pages = 1
                             st.session_state.past_chats[st.session_state.session_id] = {
                                 "topic": topic,
                                 "summary": summary,
-                                "messages": response.json().get("chat_history", [])
+                                "messages": st.session_state.messages
                             }
+                            save_chat_sessions(st.session_state.past_chats)
                             st.rerun()
                         except requests.exceptions.RequestException as e:
                             st.error(f"Error starting chat session: {e}")
@@ -258,45 +352,15 @@ elif st.session_state.app_stage == "chatting":
         with st.expander("Chat Summary", expanded=True):
             st.markdown(current_chat["summary"])
 
-    # Display chat messages
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            content = message["content"]
-            if message["role"] == "assistant":
-                # Parse content for code blocks
-                lines = content.split('\n')
-                in_code_block = False
-                current_code_block = []
-                code_language = None
-                
-                for line in lines:
-                    if line.strip().startswith("```"):
-                        if in_code_block:
-                            # End of code block
-                            st.code("\n".join(current_code_block), language=code_language)
-                            current_code_block = []
-                            code_language = None
-                            in_code_block = False
-                        else:
-                            # Start of code block
-                            in_code_block = True
-                            # Extract language if specified (e.g., ```python)
-                            lang_spec = line.strip()[3:].strip()
-                            if lang_spec:
-                                code_language = lang_spec
-                            else:
-                                code_language = "plaintext" # Default if no language specified
-                    elif in_code_block:
-                        current_code_block.append(line)
-                    else:
-                        # Regular text outside code block
-                        st.markdown(line)
-                
-                # If a code block was open at the end of the message
-                if in_code_block and current_code_block:
-                    st.code("\n".join(current_code_block), language=code_language)
-            else:
-                st.markdown(content)
+    # Display chat messages, newest page only; earlier ones are loaded on demand
+    messages = st.session_state.messages
+    visible = MESSAGES_PAGE_SIZE * st.session_state.get("history_pages", 1)
+    if len(messages) > visible:
+        if st.button(f"Show earlier messages ({len(messages) - visible} hidden)"):
+            st.session_state.history_pages = st.session_state.get("history_pages", 1) + 1
+            st.rerun()
+    for message in messages[-visible:]:
+        render_message(message)
 
     if prompt := st.chat_input("Ask a question about the documents..."):
         st.session_state.messages.append({"role": "user", "content": prompt})
@@ -306,24 +370,23 @@ elif st.session_state.app_stage == "chatting":
         with st.spinner("Thinking... (Powered by LangGraph)"):
             # The /chat endpoint now routes to the LangGraph workflow on the backend.
             # To display intermediate steps, the backend would need to stream them back.
-            api_url = "http://127.0.0.1:5000/chat"
             payload = {
                 "session_id": st.session_state.session_id, 
                 "query": prompt,
                 "model": st.session_state.selected_model
             }
             try:
-                response = requests.post(api_url, json=payload)
+                response = backend_post("/chat", payload)
                 response.raise_for_status()
                 assistant_response = response.json().get("response", "Sorry, I couldn't get a response.")
             except requests.exceptions.RequestException as e:
                 assistant_response = f"Error connecting to the backend: {e}"
             
             st.session_state.messages.append({"role": "assistant", "content": assistant_response})
-            with st.chat_message("assistant"):
-                st.markdown(assistant_response)
+            # Only the new messages are rendered; the history above is already on screen
+            render_message(st.session_state.messages[-1])
     
-    # Update past chats history and save
-    if st.session_state.session_id in st.session_state.past_chats:
-        st.session_state.past_chats[st.session_state.session_id]["messages"] = st.session_state.messages
-        save_chat_sessions(st.session_state.past_chats) # Save after message update
+        # Update past chats history and save, only when a message was added
+        if st.session_state.session_id in st.session_state.past_chats:
+            st.session_state.past_chats[st.session_state.session_id]["messages"] = st.session_state.messages
+            save_chat_sessions(st.session_state.past_chats) # Save after message update
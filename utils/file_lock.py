@@ -0,0 +1,46 @@
+import os
+from contextlib import contextmanager
+
+if os.name == "nt":
+    import msvcrt
+
+    def _lock(fd: int, blocking: bool):
+        # msvcrt.LK_LOCK itself gives up after ~10 s, so retry until the lock is ours
+        mode = msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK
+        while True:
+            try:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, mode, 1)
+                return
+            except OSError:
+                if not blocking:
+                    raise BlockingIOError("File is locked by another process")
+
+    def _unlock(fd: int):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock(fd: int, blocking: bool):
+        fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _unlock(fd: int):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+@contextmanager
+def file_lock(path: str, blocking: bool = True):
+    """
+    Exclusive advisory lock on `path` (created if missing), held across threads and processes.
+    With `blocking=False`, raises BlockingIOError instead of waiting if someone else holds it.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        _lock(fd, blocking)
+        try:
+            yield
+        finally:
+            _unlock(fd)
+    finally:
+        os.close(fd)
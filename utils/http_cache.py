@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import requests
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from utils import tracing
+
+# Persistent cache of HTTP GET responses, revalidated with ETag / Last-Modified
+CACHE_PATH = "cache/http_cache.sqlite"
+DEFAULT_TTL = 300
+REQUEST_TIMEOUT = 15
+
+# One pooled session for all cached requests
+_session = requests.Session()
+_cache_lock = threading.Lock()
+
+@dataclass
+class CachedResponse:
+    url: str
+    status_code: int
+    text: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    from_cache: bool = False
+    stale: bool = False
+    revalidated: bool = False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}")
+
+    def json(self):
+        return json.loads(self.text)
+
+def _connect(cache_path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(cache_path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            headers TEXT NOT NULL,
+            body TEXT NOT NULL,
+            fetched_at REAL NOT NULL
+        )
+    """)
+    return conn
+
+def _cache_key(url: str, headers: dict) -> str:
+    # Responses differ by media type and by who is asking (private repos, per-token limits)
+    vary = f"{url}\n{headers.get('Accept', '')}\n{headers.get('Authorization', '')}"
+    return hashlib.sha256(vary.encode("utf-8")).hexdigest()
+
+def _load(key: str, cache_path: str) -> Optional[tuple]:
+    with _cache_lock:
+        conn = _connect(cache_path)
+        try:
+            return conn.execute(
+                "SELECT etag, last_modified, headers, body, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        finally:
+            conn.close()
+
+def _store(key: str, url: str, etag, last_modified, headers: dict, body: str, cache_path: str):
+    with _cache_lock:
+        conn = _connect(cache_path)
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, url, etag, last_modified, headers, body, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, url, etag, last_modified, json.dumps(headers), body, time.time()),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+def get_cached(url: str, headers: dict = None, cache_path: str = CACHE_PATH) -> Optional[CachedResponse]:
+    """Returns the cached response for a URL regardless of its age, without touching the network."""
+    headers = headers or {}
+    row = _load(_cache_key(url, headers), cache_path)
+    if row is None:
+        return None
+    _, _, cached_headers, body, _ = row
+    return CachedResponse(url, 200, body, json.loads(cached_headers), from_cache=True, stale=True)
+
+def cached_get(url: str, headers: dict = None, ttl: float = DEFAULT_TTL, cache_path: str = CACHE_PATH) -> CachedResponse:
+    """
+    Performs a GET through the persistent cache.
+    Fresh entries (younger than `ttl` seconds) are served without a request; stale entries are
+    revalidated with If-None-Match / If-Modified-Since so unchanged resources come back as a 304.
+    """
+    with tracing.span("http.cached_get", url=url) as s:
+        response = _cached_get(url, headers, ttl, cache_path)
+        s.set(status_code=response.status_code, cache_hit=response.from_cache, revalidated=response.revalidated)
+        return response
+
+def _cached_get(url: str, headers: dict, ttl: float, cache_path: str) -> CachedResponse:
+    headers = dict(headers or {})
+    key = _cache_key(url, headers)
+    row = _load(key, cache_path)
+
+    if row is not None:
+        etag, last_modified, cached_headers, body, fetched_at = row
+        if time.time() - fetched_at < ttl:
+            return CachedResponse(url, 200, body, json.loads(cached_headers), from_cache=True)
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+    response = _session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    response_headers = dict(response.headers)
+
+    if response.status_code == 304 and row is not None:
+        # Not modified: refresh the entry's age and keep the cached body
+        merged_headers = {**json.loads(cached_headers), **response_headers}
+        _store(key, url, etag, last_modified, merged_headers, body, cache_path)
+        return CachedResponse(url, 200, body, merged_headers, from_cache=True, revalidated=True)
+
+    if response.status_code == 200:
+        _store(
+            key, url, response.headers.get("ETag"), response.headers.get("Last-Modified"),
+            response_headers, response.text, cache_path,
+        )
+    return CachedResponse(url, response.status_code, response.text, response_headers)
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+import functools
+import inspect
+
+# Spans are appended as JSON lines to this file; tracing is disabled when it is unset
+TRACE_FILE = os.getenv("AIRA_TRACE_FILE")
+ENABLED = bool(TRACE_FILE)
+
+_current_span = contextvars.ContextVar("aira_current_span", default=None)
+_export_lock = threading.Lock()
+_export_file = None
+
+class _NoopSpan:
+    """Returned while tracing is disabled, so instrumented code pays for one function call and nothing else."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start_ns", "_token")
+
+    def __init__(self, name: str, attributes: dict):
+        parent = _current_span.get()
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        """Adds attributes (chunk counts, token counts, cache hits, ...) to the span."""
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end_ns = time.time_ns()
+        _current_span.reset(self._token)
+        record = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": end_ns,
+            "duration_ms": round((end_ns - self.start_ns) / 1e6, 3),
+            "status": "error" if exc_type else "ok",
+            "attributes": self.attributes,
+        }
+        if exc_type:
+            record["error"] = f"{exc_type.__name__}: {exc}"
+        _export(record)
+        return False
+
+def _export(record: dict):
+    global _export_file
+    line = json.dumps(record, default=str) + "\n"
+    with _export_lock:
+        if _export_file is None:
+            os.makedirs(os.path.dirname(TRACE_FILE) or ".", exist_ok=True)
+            _export_file = open(TRACE_FILE, "a", encoding="utf-8", buffering=1)
+        _export_file.write(line)
+
+def span(name: str, **attributes):
+    """
+    Context manager that records a span nested under the current one (per thread / asyncio task).
+    Use `with span("name", key=value) as s: ... s.set(other=value)`.
+    """
+    if not ENABLED:
+        return _NOOP_SPAN
+    return Span(name, attributes)
+
+def current_span():
+    """Returns the innermost open span (a no-op span if there is none), e.g. to attach results to a @traced function's span."""
+    return _current_span.get() or _NOOP_SPAN
+
+def traced(name: str = None):
+    """Decorator that wraps a sync or async function in a span named after it (a no-op while tracing is disabled)."""
+    def decorator(fn):
+        if not ENABLED:
+            return fn
+        span_name = name or fn.__qualname__
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def propagate(fn):
+    """
+    Binds `fn` to a copy of the caller's context, so spans it opens on another thread
+    (thread pools, pipeline stages) nest under the caller's current span.
+    """
+    if not ENABLED:
+        return fn
+    context = contextvars.copy_context()
+    return functools.partial(context.run, fn)